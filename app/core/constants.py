@@ -11,7 +11,8 @@ _RE_SIGNATURE_TAG = re.compile(r'<signature>.*?</signature>', re.DOTALL)
 
 # 用于解析工具调用
 _RE_TOOL_CALL = re.compile(r'\[Calling tool:\s*([^\]]+)\]')
-_RE_INPUT_PREFIX = re.compile(r'^[\s]*Input:\s*')
+# 用 .match(text, pos) 在工具标记之后原位匹配（match 本身锚定在 pos，不能再写 ^）
+_RE_INPUT_PREFIX = re.compile(r'\s*Input:\s*')
 _RE_MARKDOWN_START = re.compile(r'```(?:json)?\s*')
 _RE_MARKDOWN_END = re.compile(r'\s*```')
 
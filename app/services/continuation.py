@@ -52,9 +52,6 @@ class TruncationDetector:
     def __init__(self, config: Optional[ContinuationConfig] = None):
         self.config = config or get_settings().continuation
 
-        # 代码块模式
-        self._code_block_pattern = re.compile(r'```(\w*)\n?')
-
         # 句子结束模式
         self._sentence_end_pattern = re.compile(r'[.!?。！？]\s*$')
 
@@ -115,11 +112,7 @@ class TruncationDetector:
 
     def _check_code_blocks(self, text: str) -> TruncationInfo:
         """检查未闭合的代码块"""
-        # 计算代码块开始和结束标记
-        opens = len(self._code_block_pattern.findall(text))
-        closes = text.count('```') - opens
-
-        # 简化：计算 ``` 总数
+        # 简化：计算 ``` 总数（奇数即未闭合）
         total_markers = text.count('```')
 
         if total_markers % 2 == 1:
@@ -16,12 +16,39 @@ from app.core.constants import (
     _RE_THINKING_TAG, _RE_THINKING_UNCLOSED, _RE_THINKING_UNOPEN,
     _RE_REDACTED_THINKING, _RE_SIGNATURE_TAG, _RE_TRAILING_COMMA_OBJ,
     _RE_TRAILING_COMMA_ARR, _RE_MARKDOWN_START, _RE_MARKDOWN_END,
-    _RE_XML_TOOL_CALL, _RE_XML_PARAM, _RE_TOOL_CALL, _RE_INPUT_PREFIX,
+    _RE_XML_TOOL_CALL, _RE_XML_PARAM, _RE_INPUT_PREFIX,
     _RE_NEXT_MARKER
 )
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于运行环境
+    orjson = None
+
 logger = logging.getLogger("ai_history_manager_api")
 
+
+if orjson is not None:
+
+    # 19 位以上的数字串可能超出 64 位整数范围：orjson 会把这类整数静默转成浮点数而不报错，
+    # 交给标准库解析以保持精度（字符串里的长数字只是多走一次标准库，结果不变）
+    _LONG_DIGITS = re.compile(r'\d{19}')
+
+    def _json_loads(s: str):
+        """优先用 orjson 解析；orjson 拒绝或会丢失精度的输入（NaN、超出 64 位的整数等）交给标准库
+
+        orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，两者失败时抛出的异常类型一致。
+        """
+        if _LONG_DIGITS.search(s):
+            return json.loads(s)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            return json.loads(s)
+
+else:
+    _json_loads = json.loads
+
 def extract_content_item(item: dict) -> str:
     """提取单个 content item 的文本表示"""
     item_type = item.get("type", "")
@@ -450,7 +477,7 @@ def escape_json_string_newlines(json_str: str) -> str:
 
 def _try_parse_json(json_str: str, end_pos: int) -> tuple[dict, int]:
     try:
-        return json.loads(json_str), end_pos
+        return _json_loads(json_str), end_pos
     except json.JSONDecodeError:
         pass
     return _try_repair_json(json_str, end_pos)
@@ -577,9 +604,8 @@ def split_thinking_blocks(text: str) -> list[dict]:
         if thinking and thinking.strip(): blocks.append({"type": "thinking", "thinking": thinking})
         return blocks
     blocks = []
-    pattern = re.compile(r"<thinking>(.*?)</thinking>", re.IGNORECASE | re.DOTALL)
     last_end = 0
-    for match in pattern.finditer(text):
+    for match in _RE_THINKING_TAG.finditer(text):
         if match.start() > last_end:
             prefix = text[last_end:match.start()]
             if prefix and prefix.strip(): blocks.append({"type": "text", "text": prefix})
@@ -612,26 +638,39 @@ def tool_calls_to_blocks(tool_calls: list) -> list[dict]:
         tool_id = tc.get("id") or f"toolu_{uuid.uuid4().hex[:12]}"
         if not args_str: parsed_input = {}
         else:
-            try: parsed_input = json.loads(args_str)
+            try: parsed_input = _json_loads(args_str)
             except json.JSONDecodeError:
                 try: parsed_input = _try_parse_json(args_str, len(args_str))[0]
                 except Exception as e: parsed_input = {"_raw": args_str, "_parse_error": str(e)}
         blocks.append({"type": "tool_use", "id": tool_id, "name": name, "input": parsed_input})
     return blocks
 
+# JSON 值可能的首字符（含标准库接受的 NaN/Infinity）；其他开头的参数值必然是普通字符串
+_JSON_VALUE_STARTS = frozenset('{["-0123456789tfnNI')
+
+def _xml_param_value(param_value: str):
+    if not param_value or param_value[0] not in _JSON_VALUE_STARTS: return param_value
+    try: return json.loads(param_value)
+    except (json.JSONDecodeError, ValueError): return param_value
+
 def parse_xml_tool_params(xml_content: str) -> dict:
-    params = {}
-    for match in _RE_XML_PARAM.finditer(xml_content):
-        param_name = match.group(1)
-        param_value = match.group(2).strip()
-        try: params[param_name] = json.loads(param_value)
-        except (json.JSONDecodeError, ValueError): params[param_name] = param_value
-    return params
+    # 文件路径、命令等普通文本参数按首字符直接判定，不走一次注定失败的 json.loads
+    return {
+        match.group(1): _xml_param_value(match.group(2).strip())
+        for match in _RE_XML_PARAM.finditer(xml_content)
+    }
 
 def parse_xml_tool_blocks(text: str) -> list[dict]:
+    # 工具块必有闭合标签：不含 "</" 的文本（绝大多数普通回复）用一次 C 级查找跳过正则
+    if "</" not in text:
+        return [{"type": "text", "text": text}] if text and text.strip() else []
+    return _xml_tool_blocks_from(text, _RE_XML_TOOL_CALL.search(text))
+
+def _xml_tool_blocks_from(text: str, match: Optional[re.Match]) -> list[dict]:
+    """从已找到的第一个 XML 工具块开始切分文本（调用方已搜索过的部分不再重扫）"""
     blocks = []
     last_end = 0
-    for match in _RE_XML_TOOL_CALL.finditer(text):
+    while match:
         before_text = text[last_end:match.start()]
         if before_text and before_text.strip(): blocks.append({"type": "text", "text": before_text})
         tool_name = match.group(1)
@@ -639,27 +678,47 @@ def parse_xml_tool_blocks(text: str) -> list[dict]:
         params = parse_xml_tool_params(xml_content)
         blocks.append({"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:12]}", "name": tool_name, "input": params})
         last_end = match.end()
+        match = _RE_XML_TOOL_CALL.search(text, last_end)
     if last_end < len(text):
         remaining = text[last_end:]
         if remaining and remaining.strip(): blocks.append({"type": "text", "text": remaining})
     return blocks
 
+_TOOL_CALL_MARKER = "[Calling tool:"
+
+def _find_tool_call_marker(text: str, pos: int) -> Optional[tuple[int, int, str]]:
+    """查找 "[Calling tool: 名称]" 标记，匹配范围与 constants._RE_TOOL_CALL.search 一致
+
+    两次 str.find 定位标记和右括号，不经过正则引擎。
+
+    Returns:
+        (标记起点, 标记终点, 括号内的工具名原文)，找不到时返回 None
+    """
+    while True:
+        start = text.find(_TOOL_CALL_MARKER, pos)
+        if start == -1: return None
+        name_start = start + len(_TOOL_CALL_MARKER)
+        close = text.find("]", name_start)
+        # 其后再无 "]" 时后面的标记同样无法闭合
+        if close == -1: return None
+        if close > name_start: return start, close + 1, text[name_start:close]
+        pos = start + 1
+
 def parse_inline_tool_blocks(text: str) -> list[dict]:
     blocks = []
     last_end = 0
     pos = 0
     while pos < len(text):
-        match = _RE_TOOL_CALL.search(text[pos:])
-        if not match: break
-        match_start = pos + match.start()
-        match_end = pos + match.end()
+        marker = _find_tool_call_marker(text, pos)
+        if not marker: break
+        match_start, match_end, raw_name = marker
         before_text = text[last_end:match_start]
         if before_text and before_text.strip(): blocks.append({"type": "text", "text": before_text})
-        tool_name = match.group(1).strip()
-        after_match = text[match_end:]
-        input_match = _RE_INPUT_PREFIX.match(after_match)
+        tool_name = raw_name.strip()
+        # 在原文上从标记终点原位匹配，避免复制其后的全部文本
+        input_match = _RE_INPUT_PREFIX.match(text, match_end)
         if input_match:
-            json_start_pos = match_end + input_match.end()
+            json_start_pos = input_match.end()
             try:
                 input_json, json_end_pos = extract_json_from_position(text, json_start_pos)
                 blocks.append({"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:12]}", "name": tool_name, "input": input_json})
@@ -668,18 +727,18 @@ def parse_inline_tool_blocks(text: str) -> list[dict]:
                 continue
             except Exception as e:
                 logger.warning(f"JSON parse failed for tool {tool_name} at pos {json_start_pos}: {e}")
-                next_marker = _RE_NEXT_MARKER.search(after_match[input_match.end():])
-                if next_marker: raw_text = after_match[input_match.end():input_match.end() + next_marker.start()].strip()
-                else: raw_text = after_match[input_match.end():].strip()
+                next_marker = _RE_NEXT_MARKER.search(text, json_start_pos)
+                if next_marker: raw_text = text[json_start_pos:next_marker.start()].strip()
+                else: raw_text = text[json_start_pos:].strip()
                 try:
                     input_json, _ = _try_parse_json(raw_text, 0)
                     blocks.append({"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:12]}", "name": tool_name, "input": input_json})
-                    last_end = match_end + input_match.end() + len(raw_text)
+                    last_end = json_start_pos + len(raw_text)
                     pos = last_end
                     continue
                 except Exception as e:
                     blocks.append({"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:12]}", "name": tool_name, "input": {"_raw": raw_text[:2000], "_parse_error": str(e)}})
-                    last_end = match_end + input_match.end() + len(raw_text)
+                    last_end = json_start_pos + len(raw_text)
                     pos = last_end
                     continue
         marker_text = text[match_start:match_end]
@@ -690,8 +749,11 @@ def parse_inline_tool_blocks(text: str) -> list[dict]:
         remaining = text[last_end:]
         if remaining and remaining.strip(): blocks.append({"type": "text", "text": remaining})
     has_tool_use = any(b.get("type") == "tool_use" for b in blocks)
-    if not has_tool_use and _RE_XML_TOOL_CALL.search(text):
-        return parse_xml_tool_blocks(text)
+    if not has_tool_use and "</" in text:
+        # 回退到 XML 格式时复用这次搜索到的首个匹配，不再从头扫描
+        xml_match = _RE_XML_TOOL_CALL.search(text)
+        if xml_match:
+            return _xml_tool_blocks_from(text, xml_match)
     return blocks
 
 def parse_inline_tool_calls(text: str) -> tuple[list, str]:
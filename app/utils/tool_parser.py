@@ -17,7 +17,7 @@ from .logging import get_logger
 logger = get_logger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class ParsedToolCall:
     """解析后的工具调用"""
     id: str
@@ -46,7 +46,7 @@ class ParsedToolCall:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolParseResult:
     """工具解析结果"""
     tool_calls: list[ParsedToolCall] = field(default_factory=list)
@@ -94,6 +94,22 @@ INCOMPLETE_TOOL_PATTERN = re.compile(
 )
 
 
+# XML 开始标签（与 XML_TOOL_PATTERN 一样忽略大小写），用于无标签文本的提前返回
+_XML_TOOL_OPEN = re.compile(r'<tool_call>', re.IGNORECASE)
+
+# 第一个工具调用起点（内联或 XML）
+FIRST_TOOL_PATTERN = re.compile(
+    r'\[Calling tool:\s*[^\]]+\]|<tool_call>',
+    re.IGNORECASE
+)
+
+# 不完整检测标记: 内联/Input 区分大小写，XML 标签忽略大小写
+INCOMPLETE_MARKER_PATTERN = re.compile(
+    r'(?P<inline>\[Calling tool:)|(?P<input>Input:)'
+    r'|(?P<xml_open>(?i:<tool_call>))|(?P<xml_close>(?i:</tool_call>))'
+)
+
+
 def generate_tool_id() -> str:
     """生成工具调用 ID"""
     return f"toolu_{uuid.uuid4().hex[:24]}"
@@ -271,6 +287,10 @@ def parse_xml_tool_calls(text: str) -> ToolParseResult:
     Returns:
         ToolParseResult
     """
+    # 没有 XML 开始标签（任意大小写）时直接返回，跳过完整的工具块匹配
+    if not _XML_TOOL_OPEN.search(text):
+        return ToolParseResult(remaining_text=text.strip())
+
     result = ToolParseResult()
     tool_calls = []
     remaining_text = text
@@ -379,17 +399,30 @@ def has_incomplete_tool_call(text: str) -> bool:
     if not text:
         return False
 
+    # 一次扫描收集所有标记位置，避免多次 rfind / count 重扫全文
+    last_inline = -1
+    last_input = -1
+    open_count = 0
+    close_count = 0
+    for match in INCOMPLETE_MARKER_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == 'inline':
+            last_inline = match.start()
+        elif kind == 'input':
+            last_input = match.start()
+        elif kind == 'xml_open':
+            open_count += 1
+        else:
+            close_count += 1
+
     # 检查内联格式的不完整调用
     # 1. 有 [Calling tool: 但没有闭合的 ]
-    if '[Calling tool:' in text and not text.rstrip().endswith('}'):
-        last_bracket = text.rfind('[Calling tool:')
-        after = text[last_bracket:]
-        if ']' not in after:
+    if last_inline >= 0 and not text.rstrip().endswith('}'):
+        if text.find(']', last_inline) == -1:
             return True
 
     # 2. 有 Input: 但 JSON 不完整
-    if 'Input:' in text:
-        last_input = text.rfind('Input:')
+    if last_input >= 0:
         after = text[last_input + 6:].strip()
         if after.startswith('{'):
             # 检查括号是否平衡
@@ -418,11 +451,8 @@ def has_incomplete_tool_call(text: str) -> bool:
                 return True
 
     # 检查 XML 格式的不完整调用
-    if '<tool_call>' in text.lower():
-        open_count = text.lower().count('<tool_call>')
-        close_count = text.lower().count('</tool_call>')
-        if open_count > close_count:
-            return True
+    if open_count > close_count:
+        return True
 
     return False
 
@@ -436,18 +466,10 @@ def extract_text_before_tools(text: str) -> str:
     Returns:
         工具调用之前的文本
     """
-    # 查找第一个工具调用
-    inline_match = INLINE_TOOL_PATTERN.search(text)
-    xml_match = re.search(r'<tool_call>', text, re.IGNORECASE)
-
-    positions = []
-    if inline_match:
-        positions.append(inline_match.start())
-    if xml_match:
-        positions.append(xml_match.start())
-
-    if positions:
-        return text[:min(positions)].strip()
+    # 查找第一个工具调用（单次扫描，最左匹配即为最早位置）
+    match = FIRST_TOOL_PATTERN.search(text)
+    if match:
+        return text[:match.start()].strip()
 
     return text
 
@@ -14,15 +14,99 @@ Message Optimizer - 消息优化器模块
 """
 
 import re
-import json
 import logging
 from typing import Optional, List, Dict, Tuple, Any
 from dataclasses import dataclass, field
 from enum import Enum
 
+import orjson
+
+try:
+    import xxhash
+except ImportError:  # 可选依赖，缺失时回退到 blake2b
+    xxhash = None
+    import hashlib
+
 logger = logging.getLogger("message_optimizer")
 
 
+# ==================== 预编译正则 ====================
+
+# 截断检测模式: 名称 -> (模式, 置信度)
+_TRUNCATION_PATTERNS = {
+    # 高置信度模式 (0.9+)
+    "code_block_unclosed": (r'```[^`]*$', 0.95),
+    "json_brace_unclosed": (r'\{[^}]*$', 0.85),
+    "sql_insert_incomplete": (r'\bINSERT\s+INTO\s+\w+\s*\([^)]*$', 0.90),
+    "sql_values_incomplete": (r'\bVALUES\s*\([^)]*$', 0.90),
+
+    # 中置信度模式 (0.7-0.9)
+    "function_def_incomplete": (r'function\s+\w+\s*\([^)]*$', 0.80),
+    "arrow_function_incomplete": (r'=>\s*\{[^}]*$', 0.80),
+
+    # 工具调用相关 (高置信度)
+    "tool_call_json_incomplete": (r'\[Calling tool:.*\{[^}]*$', 0.95),
+}
+
+_COMPILED_TRUNCATION_PATTERNS = {
+    name: (re.compile(pattern, re.IGNORECASE | re.DOTALL), confidence)
+    for name, (pattern, confidence) in _TRUNCATION_PATTERNS.items()
+}
+
+# 可用 rfind 代替正则的末尾锚定模式: 名称 -> (开符号, 禁止出现在其后的字符)
+_LITERAL_TAIL_CHECKS = {
+    "code_block_unclosed": ("```", "`"),
+    "json_brace_unclosed": ("{", "}"),
+}
+
+# 工具输出类型检测（只扫描前 500 字符）
+_FIRST_NON_WS_RE = re.compile(r'\S')
+_CODE_KW_RE = re.compile(r'(?:def|function|class|import|const|let|var) ')
+_LOG_LINE_RE = re.compile(r'\d{4}-\d{2}-\d{2}.*?(INFO|DEBUG|ERROR|WARN)')
+
+# 激进压缩: 空白折叠 + 行尾注释移除，单次扫描完成
+_CLEAN_RE = re.compile(r'(\s+)|//[^\n]*|#[^\n]*')
+
+
+def _clean_replacement(match: re.Match) -> str:
+    """空白替换为单个空格，注释直接删除"""
+    return ' ' if match.group(1) else ''
+
+
+def _content_digest(content: str):
+    """计算完整内容的确定性摘要，用于去重"""
+    if xxhash is not None:
+        return xxhash.xxh3_64_intdigest(content)
+    return hashlib.blake2b(content.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+
+
+def _suffix_prefix_overlap(text: str, pattern: str) -> int:
+    """返回 text 的后缀与 pattern 的前缀的最长重叠长度（KMP，线性时间）"""
+    if not text or not pattern:
+        return 0
+
+    # pattern 的失败函数
+    failure = [0] * len(pattern)
+    k = 0
+    for i in range(1, len(pattern)):
+        while k and pattern[i] != pattern[k]:
+            k = failure[k - 1]
+        if pattern[i] == pattern[k]:
+            k += 1
+        failure[i] = k
+
+    # 用 text 驱动自动机，结束状态即为重叠长度
+    q = 0
+    for ch in text:
+        if q == len(pattern):
+            q = failure[q - 1]
+        while q and ch != pattern[q]:
+            q = failure[q - 1]
+        if ch == pattern[q]:
+            q += 1
+    return q
+
+
 # ==================== 配置 ====================
 
 class CompressionLevel(Enum):
@@ -33,6 +117,12 @@ class CompressionLevel(Enum):
     AGGRESSIVE = 3  # 激进压缩：摘要化、移除非关键内容
 
 
+# 热路径中使用的整数级别，避免重复访问 Enum 属性
+_LEVEL_LIGHT = CompressionLevel.LIGHT.value
+_LEVEL_MEDIUM = CompressionLevel.MEDIUM.value
+_LEVEL_AGGRESSIVE = CompressionLevel.AGGRESSIVE.value
+
+
 @dataclass
 class OptimizerConfig:
     """优化器配置"""
@@ -107,7 +197,9 @@ class MessageOptimizer:
             OptimizationResult: 优化结果
         """
         target = target_chars or self.config.max_total_chars
-        original_chars = self._count_chars(messages)
+        # 每条消息只测量一次，各阶段在修改内容时同步更新对应大小
+        sized = self._sized_messages(messages)
+        original_chars = sum(size for _, size in sized)
         original_count = len(messages)
         actions = []
 
@@ -123,31 +215,33 @@ class MessageOptimizer:
                 actions_taken=["no_optimization_needed"]
             )
 
-        optimized = list(messages)
+        # 压缩级别只取一次整数值，后续直接比较整数
+        level = self.config.compression_level.value
 
         # 阶段 1：压缩工具输出
-        if self.config.compression_level.value >= CompressionLevel.LIGHT.value:
-            optimized, tool_actions = self._compress_tool_outputs(optimized)
+        if level >= _LEVEL_LIGHT:
+            sized, tool_actions = self._compress_tool_outputs(sized)
             actions.extend(tool_actions)
 
         # 阶段 2：移除冗余内容
-        if self.config.compression_level.value >= CompressionLevel.MEDIUM.value:
-            optimized, redundancy_actions = self._remove_redundancy(optimized)
+        if level >= _LEVEL_MEDIUM:
+            sized, redundancy_actions = self._remove_redundancy(sized)
             actions.extend(redundancy_actions)
 
         # 阶段 3：截断旧消息
-        current_chars = self._count_chars(optimized)
+        current_chars = sum(size for _, size in sized)
         if current_chars > target:
-            optimized, truncate_actions = self._truncate_old_messages(optimized, target)
+            sized, truncate_actions = self._truncate_old_messages(sized, target)
             actions.extend(truncate_actions)
 
         # 阶段 4：激进压缩（如果仍然超限）
-        current_chars = self._count_chars(optimized)
-        if current_chars > target and self.config.compression_level == CompressionLevel.AGGRESSIVE:
-            optimized, aggressive_actions = self._aggressive_compress(optimized, target)
+        current_chars = sum(size for _, size in sized)
+        if current_chars > target and level == _LEVEL_AGGRESSIVE:
+            sized, aggressive_actions = self._aggressive_compress(sized, target)
             actions.extend(aggressive_actions)
 
-        optimized_chars = self._count_chars(optimized)
+        optimized = [msg for msg, _ in sized]
+        optimized_chars = sum(size for _, size in sized)
         compression_ratio = optimized_chars / original_chars if original_chars > 0 else 1.0
 
         # 更新统计
@@ -165,136 +259,177 @@ class MessageOptimizer:
             actions_taken=actions
         )
 
-    def _compress_tool_outputs(self, messages: List[Dict]) -> Tuple[List[Dict], List[str]]:
+    def _sized_messages(self, messages: List[Dict]) -> List[Tuple[Dict, int]]:
+        """为每条消息附加字符数，供各优化阶段复用"""
+        return [(msg, self._message_chars(msg)) for msg in messages]
+
+    def _compress_tool_outputs(self, sized: List[Tuple[Dict, int]]) -> Tuple[List[Tuple[Dict, int]], List[str]]:
         """压缩工具输出"""
         actions = []
         result = []
+        recent_start = len(sized) - self.config.keep_recent_messages
+        max_single_chars = self.config.max_single_message_chars
 
-        for i, msg in enumerate(messages):
+        for i, (msg, size) in enumerate(sized):
             # 跳过最近的消息
-            if i >= len(messages) - self.config.keep_recent_messages:
-                result.append(msg)
+            if i >= recent_start:
+                result.append((msg, size))
                 continue
 
             content = msg.get("content", "")
+            role = msg.get("role")
+
+            # 非用户消息且非字符串内容，无需处理
+            if role != "user" and not isinstance(content, str):
+                result.append((msg, size))
+                continue
 
             # 处理工具结果消息
-            if msg.get("role") == "user" and isinstance(content, list):
-                compressed_content = []
-                for item in content:
-                    if item.get("type") == "tool_result":
-                        tool_content = item.get("content", "")
-                        if isinstance(tool_content, str) and len(tool_content) > self.config.max_tool_output_chars:
-                            # 压缩工具输出
-                            compressed = self._compress_tool_content(tool_content)
-                            item = dict(item)
-                            item["content"] = compressed
-                            actions.append(f"compressed_tool_output_{item.get('tool_use_id', 'unknown')[:8]}")
-                    compressed_content.append(item)
-                msg = dict(msg)
-                msg["content"] = compressed_content
+            if role == "user" and isinstance(content, list):
+                # 单次遍历：仅在第一处需要压缩时才复制内容列表
+                new_items = None
+                for idx, item in enumerate(content):
+                    tool_len = self._oversized_tool_result_len(item)
+                    if tool_len:
+                        if new_items is None:
+                            new_items = content[:idx]
+                        # 压缩工具输出（复用已计算的长度）
+                        item = {**item, "content": self._compress_tool_content(item["content"], tool_len)}
+                        actions.append(f"compressed_tool_output_{item.get('tool_use_id', 'unknown')[:8]}")
+                        new_items.append(item)
+                    elif new_items is not None:
+                        new_items.append(item)
+
+                # 没有超长的工具结果时直接保留原消息，避免复制
+                if new_items is not None:
+                    msg = {**msg, "content": new_items}
+                    size = self._message_chars(msg)
 
             # 处理普通字符串内容
-            elif isinstance(content, str) and len(content) > self.config.max_single_message_chars:
-                msg = dict(msg)
-                msg["content"] = self._truncate_with_summary(content, self.config.max_single_message_chars)
+            elif isinstance(content, str) and size > max_single_chars:
+                # 字符串内容的 size 即 len(content)
+                msg = {**msg, "content": self._truncate_with_summary(content, max_single_chars, size)}
+                size = len(msg["content"])
                 actions.append(f"truncated_message_{i}")
 
-            result.append(msg)
+            result.append((msg, size))
 
         return result, actions
 
-    def _compress_tool_content(self, content: str) -> str:
-        """压缩工具内容"""
+    def _oversized_tool_result_len(self, item: Dict) -> int:
+        """超长工具结果返回其内容长度，否则返回 0"""
+        if item.get("type") != "tool_result":
+            return 0
+        tool_content = item.get("content", "")
+        if not isinstance(tool_content, str):
+            return 0
+        n = len(tool_content)
+        return n if n > self.config.max_tool_output_chars else 0
+
+    def _compress_tool_content(self, content: str, n: Optional[int] = None) -> str:
+        """压缩工具内容（n 为调用方已知的 len(content)）"""
         max_chars = self.config.max_tool_output_chars
+        if n is None:
+            n = len(content)
 
-        if len(content) <= max_chars:
+        if n <= max_chars:
             return content
 
         # 尝试智能压缩
         # 1. 如果是 JSON，尝试压缩
-        if content.strip().startswith('{') or content.strip().startswith('['):
+        first = _FIRST_NON_WS_RE.search(content)
+        if first and first.group() in '{[':
             try:
-                data = json.loads(content)
-                # 压缩 JSON
-                compressed = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+                data = orjson.loads(content)
+                # 压缩 JSON（orjson 默认输出紧凑格式且保留非 ASCII 字符）
+                compressed = orjson.dumps(data).decode()
                 if len(compressed) <= max_chars:
                     return compressed
-            except json.JSONDecodeError:
+            except (orjson.JSONDecodeError, orjson.JSONEncodeError):
                 pass
 
         # 2. 如果是代码输出，保留头尾
         head_size = max_chars // 3
         tail_size = max_chars // 3
-        middle_marker = f"\n\n... [{len(content) - head_size - tail_size} chars truncated] ...\n\n"
+        middle_marker = f"\n\n... [{n - head_size - tail_size} chars truncated] ...\n\n"
 
-        return content[:head_size] + middle_marker + content[-tail_size:]
+        return ''.join((content[:head_size], middle_marker, content[-tail_size:]))
 
-    def _truncate_with_summary(self, content: str, max_chars: int) -> str:
-        """截断内容并添加摘要"""
-        if len(content) <= max_chars:
+    def _truncate_with_summary(self, content: str, max_chars: int, n: Optional[int] = None) -> str:
+        """截断内容并添加摘要（n 为调用方已知的 len(content)）"""
+        if n is None:
+            n = len(content)
+        if n <= max_chars:
             return content
 
         # 保留开头和结尾
         head_size = int(max_chars * 0.6)
         tail_size = int(max_chars * 0.3)
 
-        truncated_size = len(content) - head_size - tail_size
+        truncated_size = n - head_size - tail_size
         marker = f"\n\n[... {truncated_size} characters truncated ...]\n\n"
 
-        return content[:head_size] + marker + content[-tail_size:]
+        return ''.join((content[:head_size], marker, content[-tail_size:]))
 
-    def _remove_redundancy(self, messages: List[Dict]) -> Tuple[List[Dict], List[str]]:
+    def _remove_redundancy(self, sized: List[Tuple[Dict, int]]) -> Tuple[List[Tuple[Dict, int]], List[str]]:
         """移除冗余内容"""
         actions = []
         result = []
         seen_contents = set()
 
-        for i, msg in enumerate(messages):
+        for i, (msg, size) in enumerate(sized):
             # 始终保留系统消息和最近消息
             if msg.get("role") == "system":
-                result.append(msg)
+                result.append((msg, size))
                 continue
 
-            if i >= len(messages) - self.config.keep_recent_messages:
-                result.append(msg)
+            if i >= len(sized) - self.config.keep_recent_messages:
+                result.append((msg, size))
                 continue
 
             # 检查重复内容
             content = msg.get("content", "")
             if isinstance(content, str):
-                content_hash = hash(content[:500])  # 只比较前 500 字符
+                content_hash = _content_digest(content)
                 if content_hash in seen_contents:
                     actions.append(f"removed_duplicate_{i}")
                     continue
                 seen_contents.add(content_hash)
 
-            result.append(msg)
+            result.append((msg, size))
 
         return result, actions
 
-    def _truncate_old_messages(self, messages: List[Dict], target_chars: int) -> Tuple[List[Dict], List[str]]:
+    def _truncate_old_messages(self, sized: List[Tuple[Dict, int]],
+                               target_chars: int) -> Tuple[List[Tuple[Dict, int]], List[str]]:
         """截断旧消息"""
         actions = []
 
-        # 分离系统消息和普通消息
+        # 分离系统消息和普通消息（字符数由调用方预先计算）
         system_msg = None
+        system_chars = 0
         regular_messages = []
+        regular_chars = 0
+        total_chars = 0
 
-        for msg in messages:
+        for msg, size in sized:
+            total_chars += size
             if msg.get("role") == "system":
-                system_msg = msg
+                system_msg = (msg, size)
+                system_chars = size
             else:
-                regular_messages.append(msg)
+                regular_messages.append((msg, size))
+                regular_chars += size
 
-        # 从最旧的消息开始移除
-        current_chars = self._count_chars(messages)
+        # 从最旧的消息开始扫描，增量扣减字符数，得到切分位置后一次切片
+        current_chars = total_chars
         removed_count = 0
+        max_removable = len(regular_messages) - self.config.keep_recent_messages
 
-        while current_chars > target_chars and len(regular_messages) > self.config.keep_recent_messages:
-            removed_msg = regular_messages.pop(0)
+        while current_chars > target_chars and removed_count < max_removable:
+            regular_chars -= regular_messages[removed_count][1]
             removed_count += 1
-            current_chars = self._count_chars([system_msg] if system_msg else []) + self._count_chars(regular_messages)
+            current_chars = system_chars + regular_chars
 
         if removed_count > 0:
             actions.append(f"removed_{removed_count}_old_messages")
@@ -303,47 +438,47 @@ class MessageOptimizer:
         result = []
         if system_msg and self.config.keep_system_message:
             result.append(system_msg)
-        result.extend(regular_messages)
+        result.extend(regular_messages[removed_count:])
 
         return result, actions
 
-    def _aggressive_compress(self, messages: List[Dict], target_chars: int) -> Tuple[List[Dict], List[str]]:
+    def _aggressive_compress(self, sized: List[Tuple[Dict, int]],
+                             target_chars: int) -> Tuple[List[Tuple[Dict, int]], List[str]]:
         """激进压缩"""
         actions = []
         result = []
 
-        for msg in messages:
+        for msg, size in sized:
             content = msg.get("content", "")
 
             if isinstance(content, str):
-                # 移除多余空白
-                compressed = re.sub(r'\s+', ' ', content)
-                # 移除代码注释
-                compressed = re.sub(r'//.*$', '', compressed, flags=re.MULTILINE)
-                compressed = re.sub(r'#.*$', '', compressed, flags=re.MULTILINE)
+                # 移除多余空白和代码注释
+                compressed = _CLEAN_RE.sub(_clean_replacement, content)
 
                 if len(compressed) < len(content):
                     msg = dict(msg)
                     msg["content"] = compressed
+                    size = len(compressed)
                     actions.append("aggressive_whitespace_removal")
 
-            result.append(msg)
+            result.append((msg, size))
 
         return result, actions
 
-    def _count_chars(self, messages: List[Dict]) -> int:
-        """计算消息总字符数"""
-        total = 0
-        for msg in messages:
-            content = msg.get("content", "")
-            if isinstance(content, str):
-                total += len(content)
-            elif isinstance(content, list):
-                for item in content:
-                    if isinstance(item, dict):
-                        total += len(str(item.get("content", "")))
-                        total += len(str(item.get("text", "")))
-        return total
+    @staticmethod
+    def _message_chars(msg: Dict) -> int:
+        """计算单条消息字符数"""
+        content = msg.get("content", "")
+        if isinstance(content, str):
+            return len(content)
+        if isinstance(content, list):
+            # 字符串值直接取长度，只有非字符串值才需要 str() 转换
+            return sum(
+                len(value) if isinstance(value, str) else len(str(value))
+                for item in content if isinstance(item, dict)
+                for value in (item.get("content", ""), item.get("text", ""))
+            )
+        return 0
 
     def estimate_tokens(self, text: str) -> int:
         """估算 token 数"""
@@ -360,21 +495,8 @@ class TruncationDetector:
     """截断检测器 - 智能检测响应是否被截断"""
 
     def __init__(self):
-        # 检测模式及其置信度
-        self._patterns = {
-            # 高置信度模式 (0.9+)
-            "code_block_unclosed": (r'```[^`]*$', 0.95),
-            "json_brace_unclosed": (r'\{[^}]*$', 0.85),
-            "sql_insert_incomplete": (r'\bINSERT\s+INTO\s+\w+\s*\([^)]*$', 0.90),
-            "sql_values_incomplete": (r'\bVALUES\s*\([^)]*$', 0.90),
-
-            # 中置信度模式 (0.7-0.9)
-            "function_def_incomplete": (r'function\s+\w+\s*\([^)]*$', 0.80),
-            "arrow_function_incomplete": (r'=>\s*\{[^}]*$', 0.80),
-
-            # 工具调用相关 (高置信度)
-            "tool_call_json_incomplete": (r'\[Calling tool:.*\{[^}]*$', 0.95),
-        }
+        # 检测模式及其置信度（模块级预编译）
+        self._patterns = _COMPILED_TRUNCATION_PATTERNS
 
     def detect(self,
                full_text: str,
@@ -438,13 +560,22 @@ class TruncationDetector:
         if len(full_text) > 100:
             last_200_chars = full_text[-200:]
             for pattern_name, (pattern, confidence) in self._patterns.items():
-                if re.search(pattern, last_200_chars, re.IGNORECASE | re.DOTALL):
-                    if confidence >= 0.85:  # 只触发高置信度模式
-                        info.is_truncated = True
-                        info.reason = f"pattern_match ({pattern_name})"
-                        info.confidence = confidence
-                        logger.warning(f"[{request_id}] 截断检测: 模式匹配 - {pattern_name} (置信度: {confidence})")
-                        return info
+                if confidence < 0.85:  # 只触发高置信度模式
+                    continue
+                literal = _LITERAL_TAIL_CHECKS.get(pattern_name)
+                if literal is not None:
+                    # 末尾锚定的字面量模式：最后一个开符号之后没有闭符号即命中
+                    opener, closer = literal
+                    idx = last_200_chars.rfind(opener)
+                    matched = idx != -1 and closer not in last_200_chars[idx + len(opener):]
+                else:
+                    matched = pattern.search(last_200_chars) is not None
+                if matched:
+                    info.is_truncated = True
+                    info.reason = f"pattern_match ({pattern_name})"
+                    info.confidence = confidence
+                    logger.warning(f"[{request_id}] 截断检测: 模式匹配 - {pattern_name} (置信度: {confidence})")
+                    return info
 
         return info
 
@@ -500,6 +631,8 @@ Your response ended with:
 ```
 
 Continue directly:"""
+        # 模板只有一个占位符，预先拆分为头尾两段，构建时直接拼接
+        self._tpl_head, self._tpl_tail = self._prompt_template.split("{truncated_ending}")
 
     def build(self,
               original_messages: List[Dict],
@@ -525,7 +658,7 @@ Continue directly:"""
         truncated_ending = truncated_text[-ending_chars:] if len(truncated_text) > ending_chars else truncated_text
 
         # 构建续传提示
-        continuation_prompt = self._prompt_template.format(truncated_ending=truncated_ending)
+        continuation_prompt = ''.join((self._tpl_head, truncated_ending, self._tpl_tail))
 
         # 构建新的消息列表
         new_messages = list(original_messages)
@@ -574,11 +707,10 @@ Continue directly:"""
         overlap_check_len = min(100, len(original_text))
         original_ending = original_text[-overlap_check_len:]
 
-        for i in range(len(original_ending), 0, -1):
-            if continuation_clean.startswith(original_ending[-i:]):
-                continuation_clean = continuation_clean[i:]
-                logger.info(f"[{request_id}] 合并响应: 检测到 {i} 字符重叠，已去除")
-                break
+        overlap = _suffix_prefix_overlap(original_ending, continuation_clean[:len(original_ending)])
+        if overlap:
+            continuation_clean = continuation_clean[overlap:]
+            logger.info(f"[{request_id}] 合并响应: 检测到 {overlap} 字符重叠，已去除")
 
         # 智能拼接
         merged = original_text + continuation_clean
@@ -628,15 +760,15 @@ class ToolOutputCompressor:
 
     def _detect_type(self, content: str) -> str:
         """检测内容类型"""
-        stripped = content.strip()
-
-        if stripped.startswith('{') or stripped.startswith('['):
+        # 定位首个非空白字符，避免 strip() 复制整段内容
+        first = _FIRST_NON_WS_RE.search(content)
+        if first and first.group() in '{[':
             return "json"
 
-        if any(kw in content[:500] for kw in ['def ', 'function ', 'class ', 'import ', 'const ', 'let ', 'var ']):
+        if _CODE_KW_RE.search(content, 0, 500):
             return "code"
 
-        if re.search(r'\d{4}-\d{2}-\d{2}.*?(INFO|DEBUG|ERROR|WARN)', content[:500]):
+        if _LOG_LINE_RE.search(content, 0, 500):
             return "log"
 
         return "text"
@@ -644,16 +776,16 @@ class ToolOutputCompressor:
     def _compress_json(self, content: str) -> str:
         """压缩 JSON"""
         try:
-            data = json.loads(content)
+            data = orjson.loads(content)
             # 压缩 JSON 格式
-            compressed = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+            compressed = orjson.dumps(data).decode()
 
             if len(compressed) <= self.max_chars:
                 return compressed
 
             # 仍然太大，截断
             return self._truncate_with_marker(compressed)
-        except json.JSONDecodeError:
+        except (orjson.JSONDecodeError, orjson.JSONEncodeError):
             return self._truncate_with_marker(content)
 
     def _compress_code(self, content: str) -> str:
@@ -687,9 +819,9 @@ class ToolOutputCompressor:
         head_lines = lines[:20]
         tail_lines = lines[-20:]
 
-        marker = f"\n... [{len(lines) - 40} log lines truncated] ...\n"
+        marker = f"... [{len(lines) - 40} log lines truncated] ..."
 
-        return '\n'.join(head_lines) + marker + '\n'.join(tail_lines)
+        return '\n'.join([*head_lines, marker, *tail_lines])
 
     def _compress_text(self, content: str) -> str:
         """压缩普通文本"""
@@ -706,7 +838,7 @@ class ToolOutputCompressor:
         truncated_size = len(content) - head_size - tail_size
         marker = f"\n\n[... {truncated_size} chars truncated ...]\n\n"
 
-        return content[:head_size] + marker + content[-tail_size:]
+        return ''.join((content[:head_size], marker, content[-tail_size:]))
 
 
 # ==================== 导出 ====================
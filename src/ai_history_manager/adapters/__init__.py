@@ -1,4 +1,4 @@
 """适配器模块"""
-from .kiro import KiroSummaryAdapter
+from .kiro import KiroEventStreamParser, KiroSummaryAdapter
 
-__all__ = ["KiroSummaryAdapter"]
+__all__ = ["KiroEventStreamParser", "KiroSummaryAdapter"]
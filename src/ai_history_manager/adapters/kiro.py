@@ -3,14 +3,119 @@
 提供与 Kiro API 集成的摘要生成功能。
 """
 
+import io
 import json
 import logging
+import struct
 from typing import Any, Optional
 
 import httpx
 
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2（httpx[http2]）
+
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+try:
+    import orjson  # 可选加速（pip install ai-history-manager[fast]）
+
+    # orjson 直接接受 memoryview / bytes，无需先复制再解码
+    _loads_payload = orjson.loads
+
+    def _dumps_str(value: str) -> bytes:
+        return orjson.dumps(value)
+
+except ImportError:
+
+    def _loads_payload(data: memoryview) -> Any:
+        return json.loads(bytes(data))
+
+    def _dumps_str(value: str) -> bytes:
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
 logger = logging.getLogger("ai_history_manager.adapters.kiro")
 
+# 帧前导中的 total_len 与 headers_len（大端 uint32），一次 C 调用解出两个字段
+_PRELUDE = struct.Struct(">II")
+
+# 请求体模板中 prompt 的占位符
+_PROMPT_PLACEHOLDER = "\x00__KIRO_PROMPT__\x00"
+
+
+class KiroEventStreamParser:
+    """增量 event-stream 解析器
+
+    按块喂入响应字节，每当缓冲区内凑齐一个完整帧就解析并返回其中的文本，
+    峰值内存只与单帧大小相关，而不是整个响应体。
+
+    帧格式: [total_len:4][headers_len:4][prelude_crc:4][headers][payload][crc:4]
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._broken = False
+
+    def feed(self, chunk: bytes) -> list[str]:
+        """喂入一块数据，返回本次解析出的文本片段
+
+        Args:
+            chunk: 新到达的响应字节
+
+        Returns:
+            已完成帧中提取的文本列表
+        """
+        if self._broken:
+            return []
+
+        buf = self._buffer
+        buf.extend(chunk)
+        text_parts: list[str] = []
+        pos = 0
+        unpack_prelude = _PRELUDE.unpack_from
+
+        # memoryview 切片不复制数据；退出 with 后释放视图才能裁剪缓冲区
+        with memoryview(buf) as mv:
+            try:
+                while len(mv) - pos >= 12:
+                    total_len, headers_len = unpack_prelude(mv, pos)
+                    if total_len == 0:
+                        # 帧长度非法，后续数据无法对齐
+                        self._broken = True
+                        break
+                    if total_len > len(mv) - pos:
+                        # 帧尚未完整，等待更多数据
+                        break
+
+                    payload_start = pos + 12 + headers_len
+                    payload_end = pos + total_len - 4
+
+                    if payload_start < payload_end:
+                        try:
+                            payload = _loads_payload(mv[payload_start:payload_end])
+
+                            # 提取内容
+                            text_content = None
+                            if "assistantResponseEvent" in payload:
+                                text_content = payload["assistantResponseEvent"].get("content")
+                            elif "content" in payload:
+                                text_content = payload["content"]
+
+                            if text_content:
+                                text_parts.append(text_content)
+                        except (json.JSONDecodeError, UnicodeDecodeError):
+                            pass
+
+                    pos += total_len
+
+            except Exception as e:
+                logger.debug(f"解析 event-stream 时出错: {e}")
+                self._broken = True
+
+        del buf[:pos]
+        return text_parts
+
 
 class KiroSummaryAdapter:
     """Kiro API 摘要生成适配器
@@ -34,6 +139,9 @@ class KiroSummaryAdapter:
     processed = await manager.pre_process_async(
         history, user_content, summary_generator=adapter.generate_summary
     )
+
+    # 适配器持有长连接，不再使用时关闭（也可用 async with）
+    await adapter.aclose()
     ```
     """
 
@@ -47,6 +155,7 @@ class KiroSummaryAdapter:
         model: str = "claude-haiku-4.5",
         timeout: int = 60,
         verify_ssl: bool = False,
+        http2: bool = True,
     ):
         """初始化适配器
 
@@ -59,6 +168,7 @@ class KiroSummaryAdapter:
             model: 摘要使用的模型（推荐使用快速模型）
             timeout: 请求超时时间（秒）
             verify_ssl: 是否验证 SSL 证书
+            http2: 是否启用 HTTP/2 多路复用（需安装 httpx[http2]，未安装时回退 HTTP/1.1）
         """
         self.api_url = api_url
         self.token = token
@@ -68,9 +178,47 @@ class KiroSummaryAdapter:
         self.model = model
         self.timeout = timeout
         self.verify_ssl = verify_ssl
+        self.http2 = http2
+        # 长连接客户端，首次调用时创建，复用连接池避免每次握手
+        self._client: Optional[httpx.AsyncClient] = None
+        # 请求头缓存: ((token, machine_id, profile_arn, client_id), 请求头)
+        self._headers_cache: Optional[tuple[tuple[Optional[str], ...], dict[str, str]]] = None
+        # 请求体模板缓存: (model, prompt 之前的字节, prompt 之后的字节)
+        self._request_template_cache: Optional[tuple[str, bytes, bytes]] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取（必要时创建）持久化的 HTTP 客户端"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                verify=self.verify_ssl,
+                timeout=self.timeout,
+                http2=self.http2 and _HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=85),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """关闭持久化的 HTTP 客户端"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "KiroSummaryAdapter":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
 
     def _build_headers(self) -> dict[str, str]:
-        """构建请求头"""
+        """构建请求头
+
+        结果按凭证缓存（直接给属性赋值也会重新生成）；httpx 发送时会复制，不会被修改。
+        """
+        key = (self.token, self.machine_id, self.profile_arn, self.client_id)
+        cached = self._headers_cache
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
         headers = {
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json",
@@ -84,16 +232,24 @@ class KiroSummaryAdapter:
         if self.client_id:
             headers["x-amzn-client-id"] = self.client_id
 
+        self._headers_cache = (key, headers)
         return headers
 
-    def _build_request(self, prompt: str) -> dict[str, Any]:
-        """构建 Kiro API 请求体"""
-        return {
+    def _request_template(self) -> tuple[bytes, bytes]:
+        """获取请求体模板（prompt 前后两段已序列化的字节）
+
+        请求体中只有 prompt 随调用变化，外层结构按 model 预先序列化一次。
+        """
+        cached = self._request_template_cache
+        if cached is not None and cached[0] == self.model:
+            return cached[1], cached[2]
+
+        envelope = {
             "conversationState": {
                 "conversationId": "",
                 "currentMessage": {
                     "userInputMessage": {
-                        "content": prompt,
+                        "content": _PROMPT_PLACEHOLDER,
                         "modelId": self.model,
                         "origin": "AI_EDITOR",
                     }
@@ -101,6 +257,15 @@ class KiroSummaryAdapter:
                 "history": [],
             }
         }
+        rendered = json.dumps(envelope, ensure_ascii=False, separators=(",", ":"))
+        head, tail = rendered.split(json.dumps(_PROMPT_PLACEHOLDER), 1)
+        self._request_template_cache = (self.model, head.encode("utf-8"), tail.encode("utf-8"))
+        return self._request_template_cache[1], self._request_template_cache[2]
+
+    def _build_request(self, prompt: str) -> bytes:
+        """构建 Kiro API 请求体（已序列化的 JSON 字节）"""
+        head, tail = self._request_template()
+        return b"".join((head, _dumps_str(prompt), tail))
 
     def _parse_event_stream(self, content: bytes) -> str:
         """解析 event-stream 格式响应
@@ -111,44 +276,10 @@ class KiroSummaryAdapter:
         Returns:
             提取的文本内容
         """
-        text_parts = []
-
-        try:
-            pos = 0
-            while pos < len(content):
-                if pos + 12 > len(content):
-                    break
-
-                total_len = int.from_bytes(content[pos : pos + 4], "big")
-                if total_len == 0 or total_len > len(content) - pos:
-                    break
-
-                headers_len = int.from_bytes(content[pos + 4 : pos + 8], "big")
-                payload_start = pos + 12 + headers_len
-                payload_end = pos + total_len - 4
-
-                if payload_start < payload_end:
-                    try:
-                        payload = json.loads(content[payload_start:payload_end].decode("utf-8"))
-
-                        # 提取内容
-                        text_content = None
-                        if "assistantResponseEvent" in payload:
-                            text_content = payload["assistantResponseEvent"].get("content")
-                        elif "content" in payload:
-                            text_content = payload["content"]
-
-                        if text_content:
-                            text_parts.append(text_content)
-                    except (json.JSONDecodeError, UnicodeDecodeError):
-                        pass
-
-                pos += total_len
-
-        except Exception as e:
-            logger.debug(f"解析 event-stream 时出错: {e}")
-
-        return "".join(text_parts)
+        # 空响应或不足一个帧前导（12 字节）时不可能包含完整帧
+        if len(content) < 12:
+            return ""
+        return "".join(KiroEventStreamParser().feed(content))
 
     async def generate_summary(self, prompt: str) -> str:
         """生成摘要
@@ -159,20 +290,24 @@ class KiroSummaryAdapter:
         Returns:
             摘要文本，失败返回空字符串
         """
-        headers = self._build_headers()
-        request_body = self._build_request(prompt)
-
         try:
-            async with httpx.AsyncClient(
-                verify=self.verify_ssl, timeout=self.timeout
-            ) as client:
-                response = await client.post(
-                    self.api_url, json=request_body, headers=headers
-                )
-
+            # 请求体编码也可能失败（如 prompt 含孤立代理字符），同样记录日志并返回空串
+            headers = self._build_headers()
+            request_body = self._build_request(prompt)
+            async with self._get_client().stream(
+                "POST", self.api_url, content=request_body, headers=headers
+            ) as response:
                 if response.status_code == 200:
-                    return self._parse_event_stream(response.content)
+                    # 边接收边解析，每个完整帧到达即提取文本
+                    parser = KiroEventStreamParser()
+                    out = io.StringIO()
+                    write = out.write
+                    async for chunk in response.aiter_bytes():
+                        for text in parser.feed(chunk):
+                            write(text)
+                    return out.getvalue()
                 else:
+                    await response.aread()
                     logger.warning(
                         f"摘要 API 调用失败: {response.status_code} - {response.text[:200]}"
                     )
@@ -1,18 +1,30 @@
 """内存缓存实现
 
-提供基于 LRU 策略的摘要缓存，支持：
+提供基于访问计数淘汰策略的摘要缓存，支持：
 - 按消息变化量检测是否需要刷新
 - 按字符变化量检测是否需要刷新
 - 过期时间控制
 """
 
+import heapq
+import sys
+import threading
 import time
-from collections import OrderedDict
+from collections import deque
 from dataclasses import dataclass
 from typing import Optional
 
+# dataclass 的 slots 参数需要 Python 3.10+，低版本退化为普通 __dict__ 实例
+_SLOTS: dict[str, bool] = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+# 单调时钟：开销低于 time.time()，且不受系统时间调整（NTP 等）影响
+_now = time.monotonic
+
+# 访问计数饱和阈值，任一条目达到后所有计数减半（老化，避免历史热点永久驻留）
+_ACCESS_COUNT_MAX = 255
+
+
+@dataclass(**_SLOTS)
 class SummaryCacheEntry:
     """摘要缓存条目
 
@@ -20,21 +32,36 @@ class SummaryCacheEntry:
         summary: 摘要文本
         old_history_count: 生成摘要时的旧历史消息数
         old_history_chars: 生成摘要时的旧历史字符数
-        updated_at: 更新时间戳
+        updated_at: 更新时间（time.monotonic() 单调时钟读数，非墙上时间）
+        access_count: 命中次数（淘汰依据）
     """
 
     summary: str
     old_history_count: int
     old_history_chars: int
     updated_at: float
+    access_count: int = 0
 
 
 class SummaryCache:
-    """轻量摘要缓存（LRU 策略）
+    """轻量摘要缓存（访问计数淘汰策略）
 
     基于会话 ID 和目标消息数缓存摘要结果，通过检测历史变化量
     来决定是否需要重新生成摘要。
 
+    命中时只递增条目的访问计数，不调整顺序；缓存满时淘汰计数最小的条目
+    （计数相同则淘汰最早插入的）。
+
+    并发模型：命中路径（get）不加锁，只有单次字典查找和计数递增，
+    在 GIL 下是安全的（并发递增偶尔丢失一次计数，只影响淘汰的精确度）。
+    写入（set，紧跟在一次摘要生成之后，频率很低）以及其他会改变字典大小
+    或遍历字典的操作（淘汰、过期删除、计数老化、清空）持有同一把
+    threading.Lock，保证遍历期间字典不被其他线程修改。
+
+    过期索引：每次 set 按写入顺序追加 (updated_at, key)，单调时钟保证队列有序，
+    cleanup_expired 只需从队首弹出过期项，代价与过期条目数成正比而非总条目数。
+    条目被覆盖/删除后留下的旧索引项按时间戳不一致识别并跳过。
+
     使用示例:
     ```python
     cache = SummaryCache(max_entries=128)
@@ -67,8 +94,11 @@ class SummaryCache:
         Args:
             max_entries: 最大缓存条目数
         """
-        self._entries: OrderedDict[str, SummaryCacheEntry] = OrderedDict()
+        self._entries: dict[str, SummaryCacheEntry] = {}
         self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # (updated_at, key)，按写入时间有序；可能含已被覆盖或删除的旧项
+        self._ttl_queue: deque[tuple[float, str]] = deque()
 
     def get(
         self,
@@ -98,15 +128,15 @@ class SummaryCache:
         Returns:
             缓存的摘要文本，不存在或需要刷新时返回 None
         """
+        # 命中路径只有这一次字典查找（访问计数记在条目上，无需再调整顺序）
         entry = self._entries.get(key)
-        if not entry:
+        if entry is None:
             return None
 
-        now = time.time()
-
-        # 检查过期时间
-        if max_age_seconds > 0 and now - entry.updated_at > max_age_seconds:
-            self._entries.pop(key, None)
+        # 检查过期时间（不检查时无需读取时钟）
+        if max_age_seconds > 0 and _now() - entry.updated_at > max_age_seconds:
+            with self._lock:
+                self._entries.pop(key, None)
             return None
 
         # 检查消息数变化
@@ -117,10 +147,54 @@ class SummaryCache:
         if old_history_chars - entry.old_history_chars >= min_delta_chars:
             return None
 
-        # 命中缓存，移到末尾（LRU）
-        self._entries.move_to_end(key)
+        # 命中缓存，递增访问计数
+        entry.access_count += 1
+        if entry.access_count >= _ACCESS_COUNT_MAX:
+            self._age_counters()
         return entry.summary
 
+    def get_with_stale(
+        self,
+        key: str,
+        old_history_count: int,
+        old_history_chars: int,
+        min_delta_messages: int,
+        min_delta_chars: int,
+        max_age_seconds: int,
+    ) -> tuple[Optional[str], bool]:
+        """获取缓存的摘要，过期条目也返回（stale-while-revalidate）
+
+        与 get 的区别：仅因超过 max_age_seconds 而过期的条目不会被删除，
+        而是连同 is_stale=True 一起返回，由调用方决定是否在后台刷新。
+        历史变化量超过阈值时仍视为未命中。
+
+        Args:
+            key: 缓存键
+            old_history_count: 当前旧历史消息数
+            old_history_chars: 当前旧历史字符数
+            min_delta_messages: 触发刷新的消息变化阈值
+            min_delta_chars: 触发刷新的字符变化阈值
+            max_age_seconds: 最大缓存时间（秒），0 表示不检查
+
+        Returns:
+            (摘要文本或 None, 是否已过期)
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+
+        if old_history_count - entry.old_history_count >= min_delta_messages:
+            return None, False
+        if old_history_chars - entry.old_history_chars >= min_delta_chars:
+            return None, False
+
+        entry.access_count += 1
+        if entry.access_count >= _ACCESS_COUNT_MAX:
+            self._age_counters()
+
+        stale = max_age_seconds > 0 and _now() - entry.updated_at > max_age_seconds
+        return entry.summary, stale
+
     def set(
         self,
         key: str,
@@ -136,17 +210,44 @@ class SummaryCache:
             old_history_count: 生成摘要时的旧历史消息数
             old_history_chars: 生成摘要时的旧历史字符数
         """
-        self._entries[key] = SummaryCacheEntry(
-            summary=summary,
-            old_history_count=old_history_count,
-            old_history_chars=old_history_chars,
-            updated_at=time.time(),
-        )
-        self._entries.move_to_end(key)
-
-        # LRU 淘汰
-        while len(self._entries) > self._max_entries:
-            self._entries.popitem(last=False)
+        with self._lock:
+            entries = self._entries
+            previous = entries.get(key)
+            if previous is None and entries:
+                over = len(entries) - self._max_entries + 1
+                if over == 1:
+                    # 常见情况只需淘汰一条：计数最小的（计数相同时 min 返回最早插入的）
+                    del entries[min(entries, key=lambda k: entries[k].access_count)]
+                elif over > 1:
+                    # 容量被调小等情况需要批量淘汰：一次选出所有待淘汰条目（nsmallest 保持插入顺序）
+                    for victim in heapq.nsmallest(
+                        over, entries, key=lambda k: entries[k].access_count
+                    ):
+                        del entries[victim]
+
+            updated_at = _now()
+            entries[key] = SummaryCacheEntry(
+                summary=summary,
+                old_history_count=old_history_count,
+                old_history_chars=old_history_chars,
+                updated_at=updated_at,
+                # 刷新摘要沿用原计数，热点会话不会因更新而变成淘汰候选
+                access_count=previous.access_count if previous is not None else 0,
+            )
+
+            ttl_queue = self._ttl_queue
+            ttl_queue.append((updated_at, key))
+            if len(ttl_queue) > 2 * max(self._max_entries, len(entries)):
+                # 旧项积累过多（频繁覆盖且长期未清理）时按现存条目重建，摊还 O(log n)
+                self._ttl_queue = deque(
+                    sorted((entry.updated_at, k) for k, entry in entries.items())
+                )
+
+    def _age_counters(self) -> None:
+        """所有条目的访问计数减半"""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.access_count >>= 1
 
     def invalidate(self, key: str) -> bool:
         """使指定缓存失效
@@ -157,7 +258,8 @@ class SummaryCache:
         Returns:
             是否存在并删除了缓存
         """
-        return self._entries.pop(key, None) is not None
+        with self._lock:
+            return self._entries.pop(key, None) is not None
 
     def clear(self) -> int:
         """清空所有缓存
@@ -165,9 +267,11 @@ class SummaryCache:
         Returns:
             清除的条目数
         """
-        count = len(self._entries)
-        self._entries.clear()
-        return count
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._ttl_queue.clear()
+            return count
 
     def size(self) -> int:
         """获取当前缓存大小
@@ -186,12 +290,17 @@ class SummaryCache:
         Returns:
             清除的条目数
         """
-        now = time.time()
-        expired_keys = [
-            key
-            for key, entry in self._entries.items()
-            if now - entry.updated_at > max_age_seconds
-        ]
-        for key in expired_keys:
-            self._entries.pop(key, None)
-        return len(expired_keys)
+        # 只弹出队首早于阈值的索引项，未过期条目不会被访问
+        cutoff = _now() - max_age_seconds
+        count = 0
+        with self._lock:
+            entries = self._entries
+            ttl_queue = self._ttl_queue
+            while ttl_queue and ttl_queue[0][0] < cutoff:
+                updated_at, key = ttl_queue.popleft()
+                entry = entries.get(key)
+                # 时间戳不一致说明条目已被覆盖（或删除后重建），该索引项作废
+                if entry is not None and entry.updated_at == updated_at:
+                    del entries[key]
+                    count += 1
+            return count
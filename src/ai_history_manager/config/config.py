@@ -3,14 +3,28 @@
 提供 HistoryConfig 配置类和 YAML 配置加载功能。
 """
 
+import logging
 import os
-from dataclasses import dataclass, field
+import sys
+from dataclasses import dataclass, field, replace
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
 import yaml
 
+try:
+    # LibYAML 的 C 实现，解析速度远快于纯 Python 版本
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # PyYAML 未编译 libyaml 支持
+    from yaml import SafeLoader as _YamlLoader
+
+logger = logging.getLogger("ai_history_manager.config")
+
+# 是否已提示过 libyaml 不可用（只在首次解析配置文件时提示一次）
+_yaml_fallback_warned = False
+
 
 class TruncateStrategy(str, Enum):
     """截断策略枚举"""
@@ -22,9 +36,29 @@ class TruncateStrategy(str, Enum):
     PRE_ESTIMATE = "pre_estimate"  # 预估检测
 
 
-@dataclass
+# dataclass 的 slots 参数需要 Python 3.10+，低版本退化为普通 __dict__ 实例
+_SLOTS: dict[str, bool] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+# 策略字符串 -> 枚举的查找表，避免逐个 TruncateStrategy(s) 的 try/except
+_STRATEGY_MAP: dict[str, TruncateStrategy] = {s.value: s for s in TruncateStrategy}
+
+
+def _parse_strategies(strategies_raw: Any) -> list[TruncateStrategy]:
+    """解析策略列表，忽略无效的策略，结果为空时使用默认策略"""
+    strategies = []
+    for s in strategies_raw:
+        if isinstance(s, TruncateStrategy):
+            strategies.append(s)
+        elif isinstance(s, str):
+            strategy = _STRATEGY_MAP.get(s)
+            if strategy is not None:  # 忽略无效的策略
+                strategies.append(strategy)
+    return strategies or [TruncateStrategy.ERROR_RETRY]
+
+
+@dataclass(frozen=True, **_SLOTS)
 class HistoryConfig:
-    """历史消息配置
+    """历史消息配置（不可变，可在多线程间安全共享；需要修改时使用 dataclasses.replace）
 
     Attributes:
         strategies: 启用的策略列表
@@ -42,6 +76,7 @@ class HistoryConfig:
         summary_cache_min_delta_chars: 旧历史新增字符数阈值
         summary_cache_max_age_seconds: 摘要最大复用时间
         summary_cache_max_entries: 最大缓存条目数
+        summary_cache_serve_stale: 缓存过期时先返回旧摘要并在后台刷新（默认关闭）
         add_warning_header: 截断时是否添加警告信息
         logging_enabled: 是否启用日志
         logging_level: 日志级别
@@ -75,6 +110,7 @@ class HistoryConfig:
     summary_cache_min_delta_chars: int = 4000  # 旧历史新增字符数阈值
     summary_cache_max_age_seconds: int = 180  # 摘要最大复用时间
     summary_cache_max_entries: int = 128  # 最大缓存条目数
+    summary_cache_serve_stale: bool = False  # 过期摘要先复用，后台刷新（默认关闭）
 
     # 是否添加截断警告
     add_warning_header: bool = True
@@ -101,6 +137,7 @@ class HistoryConfig:
             "summary_cache_min_delta_chars": self.summary_cache_min_delta_chars,
             "summary_cache_max_age_seconds": self.summary_cache_max_age_seconds,
             "summary_cache_max_entries": self.summary_cache_max_entries,
+            "summary_cache_serve_stale": self.summary_cache_serve_stale,
             "add_warning_header": self.add_warning_header,
             "logging_enabled": self.logging_enabled,
             "logging_level": self.logging_level,
@@ -109,19 +146,8 @@ class HistoryConfig:
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "HistoryConfig":
         """从字典创建配置"""
-        strategies_raw = data.get("strategies", ["error_retry"])
-        strategies = []
-        for s in strategies_raw:
-            if isinstance(s, TruncateStrategy):
-                strategies.append(s)
-            elif isinstance(s, str):
-                try:
-                    strategies.append(TruncateStrategy(s))
-                except ValueError:
-                    pass  # 忽略无效的策略
-
         return cls(
-            strategies=strategies or [TruncateStrategy.ERROR_RETRY],
+            strategies=_parse_strategies(data.get("strategies", ["error_retry"])),
             max_messages=data.get("max_messages", 30),
             max_chars=data.get("max_chars", 150000),
             summary_keep_recent=data.get("summary_keep_recent", 10),
@@ -136,6 +162,7 @@ class HistoryConfig:
             summary_cache_min_delta_chars=data.get("summary_cache_min_delta_chars", 4000),
             summary_cache_max_age_seconds=data.get("summary_cache_max_age_seconds", 180),
             summary_cache_max_entries=data.get("summary_cache_max_entries", 128),
+            summary_cache_serve_stale=data.get("summary_cache_serve_stale", False),
             add_warning_header=data.get("add_warning_header", True),
             logging_enabled=data.get("logging_enabled", True),
             logging_level=data.get("logging_level", "INFO"),
@@ -165,9 +192,37 @@ class HistoryConfig:
         return errors
 
 
+_EMPTY: dict[str, Any] = {}
+
+# 嵌套格式映射表: (YAML 分节, 分节内键名, 默认值, HistoryConfig 字段名)
+_NESTED_SPEC: tuple[tuple[str, str, Any, str], ...] = (
+    ("limits", "max_messages", 30, "max_messages"),
+    ("limits", "max_chars", 150000, "max_chars"),
+    ("summary", "keep_recent", 10, "summary_keep_recent"),
+    ("summary", "threshold", 100000, "summary_threshold"),
+    ("summary", "max_length", 2000, "summary_max_length"),
+    ("retry", "max_messages", 20, "retry_max_messages"),
+    ("retry", "max_retries", 2, "max_retries"),
+    ("estimate", "threshold", 180000, "estimate_threshold"),
+    ("estimate", "chars_per_token", 3.0, "chars_per_token"),
+    ("cache", "enabled", True, "summary_cache_enabled"),
+    ("cache", "min_delta_messages", 3, "summary_cache_min_delta_messages"),
+    ("cache", "min_delta_chars", 4000, "summary_cache_min_delta_chars"),
+    ("cache", "max_age_seconds", 180, "summary_cache_max_age_seconds"),
+    ("cache", "max_entries", 128, "summary_cache_max_entries"),
+    ("cache", "serve_stale", False, "summary_cache_serve_stale"),
+    ("warning", "add_header", True, "add_warning_header"),
+    ("logging", "enabled", True, "logging_enabled"),
+    ("logging", "level", "INFO", "logging_level"),
+)
+
+
 def load_config_from_file(file_path: str | Path) -> HistoryConfig:
     """从 YAML 文件加载配置
 
+    解析结果按 (绝对路径, 修改时间) 缓存，文件未变化时不会重复解析；
+    每次返回独立副本，调用方修改不会影响缓存。
+
     Args:
         file_path: 配置文件路径
 
@@ -180,11 +235,27 @@ def load_config_from_file(file_path: str | Path) -> HistoryConfig:
     """
     file_path = Path(file_path)
 
-    if not file_path.exists():
-        raise FileNotFoundError(f"Config file not found: {file_path}")
+    try:
+        mtime_ns = file_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Config file not found: {file_path}") from None
 
-    with open(file_path, encoding="utf-8") as f:
-        raw_data = yaml.safe_load(f)
+    cached = _load_config_cached(str(file_path.resolve()), mtime_ns)
+    return replace(cached, strategies=list(cached.strategies))
+
+
+@lru_cache(maxsize=16)
+def _load_config_cached(path: str, mtime_ns: int) -> HistoryConfig:
+    """解析 YAML 配置文件（mtime_ns 仅作为缓存键，文件修改后自动失效）"""
+    global _yaml_fallback_warned
+    if _YamlLoader is yaml.SafeLoader and not _yaml_fallback_warned:
+        _yaml_fallback_warned = True
+        logger.warning(
+            "PyYAML 未启用 libyaml，使用纯 Python 解析配置文件（较慢）；"
+            "可安装带 libyaml 支持的 PyYAML 加速"
+        )
+    with open(path, encoding="utf-8") as f:
+        raw_data = yaml.load(f, Loader=_YamlLoader)
 
     return load_config(raw_data)
 
@@ -217,69 +288,13 @@ def load_config(data: dict[str, Any] | None = None) -> HistoryConfig:
     # 支持嵌套格式（YAML 风格）
     if "history_manager" in data:
         hm = data["history_manager"]
-
-        # 解析策略
-        strategies = hm.get("strategies", ["error_retry"])
-
-        # 解析基础限制
-        limits = hm.get("limits", {})
-        max_messages = limits.get("max_messages", 30)
-        max_chars = limits.get("max_chars", 150000)
-
-        # 解析摘要配置
-        summary = hm.get("summary", {})
-        summary_keep_recent = summary.get("keep_recent", 10)
-        summary_threshold = summary.get("threshold", 100000)
-        summary_max_length = summary.get("max_length", 2000)
-
-        # 解析重试配置
-        retry = hm.get("retry", {})
-        retry_max_messages = retry.get("max_messages", 20)
-        max_retries = retry.get("max_retries", 2)
-
-        # 解析预估配置
-        estimate = hm.get("estimate", {})
-        estimate_threshold = estimate.get("threshold", 180000)
-        chars_per_token = estimate.get("chars_per_token", 3.0)
-
-        # 解析缓存配置
-        cache = hm.get("cache", {})
-        cache_enabled = cache.get("enabled", True)
-        cache_min_delta_messages = cache.get("min_delta_messages", 3)
-        cache_min_delta_chars = cache.get("min_delta_chars", 4000)
-        cache_max_age_seconds = cache.get("max_age_seconds", 180)
-        cache_max_entries = cache.get("max_entries", 128)
-
-        # 解析警告配置
-        warning = hm.get("warning", {})
-        add_warning_header = warning.get("add_header", True)
-
-        # 解析日志配置
-        logging_cfg = hm.get("logging", {})
-        logging_enabled = logging_cfg.get("enabled", True)
-        logging_level = logging_cfg.get("level", "INFO")
-
-        flat_data = {
-            "strategies": strategies,
-            "max_messages": max_messages,
-            "max_chars": max_chars,
-            "summary_keep_recent": summary_keep_recent,
-            "summary_threshold": summary_threshold,
-            "summary_max_length": summary_max_length,
-            "retry_max_messages": retry_max_messages,
-            "max_retries": max_retries,
-            "estimate_threshold": estimate_threshold,
-            "chars_per_token": chars_per_token,
-            "summary_cache_enabled": cache_enabled,
-            "summary_cache_min_delta_messages": cache_min_delta_messages,
-            "summary_cache_min_delta_chars": cache_min_delta_chars,
-            "summary_cache_max_age_seconds": cache_max_age_seconds,
-            "summary_cache_max_entries": cache_max_entries,
-            "add_warning_header": add_warning_header,
-            "logging_enabled": logging_enabled,
-            "logging_level": logging_level,
+        kwargs: dict[str, Any] = {
+            field_name: hm.get(section, _EMPTY).get(key, default)
+            for section, key, default, field_name in _NESTED_SPEC
         }
-        return HistoryConfig.from_dict(flat_data)
+        return HistoryConfig(
+            strategies=_parse_strategies(hm.get("strategies", ["error_retry"])), **kwargs
+        )
 
     # 扁平格式（直接参数）
     return HistoryConfig.from_dict(data)
@@ -294,23 +309,43 @@ def get_default_config_path() -> Path | None:
     3. 当前目录 ./history.yaml
     4. 包内默认配置
 
+    查找结果按 (环境变量, 当前目录) 缓存；配置文件在进程运行期间被创建或
+    删除时，调用 clear_default_config_path_cache() 重新查找。
+
     Returns:
         配置文件路径，不存在返回 None
     """
+    return _find_default_config_path(os.environ.get("AI_HISTORY_MANAGER_CONFIG"), os.getcwd())
+
+
+# 包内默认配置路径（仓库根目录下的 config/history.yaml）
+_PACKAGE_CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    "config",
+    "history.yaml",
+)
+
+
+@lru_cache(maxsize=8)
+def _find_default_config_path(env_path: str | None, cwd: str) -> Path | None:
+    """按搜索顺序查找默认配置文件"""
     # 环境变量
-    env_path = os.environ.get("AI_HISTORY_MANAGER_CONFIG")
-    if env_path and Path(env_path).exists():
+    if env_path and os.path.exists(env_path):
         return Path(env_path)
 
-    # 当前目录
-    for relative_path in ["config/history.yaml", "history.yaml"]:
-        path = Path.cwd() / relative_path
-        if path.exists():
-            return path
+    # 当前目录（os.path 检查，只为命中的路径构造 Path 对象）
+    for relative_path in ("config/history.yaml", "history.yaml"):
+        path = os.path.join(cwd, relative_path)
+        if os.path.exists(path):
+            return Path(path)
 
     # 包内默认配置
-    package_config = Path(__file__).parent.parent.parent.parent / "config" / "history.yaml"
-    if package_config.exists():
-        return package_config
+    if os.path.exists(_PACKAGE_CONFIG):
+        return Path(_PACKAGE_CONFIG)
 
     return None
+
+
+def clear_default_config_path_cache() -> None:
+    """清空默认配置文件路径的查找缓存"""
+    _find_default_config_path.cache_clear()
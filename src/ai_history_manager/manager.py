@@ -7,13 +7,14 @@
 - Token 预估检测
 """
 
-import json
+import asyncio
+import functools
 import logging
 from typing import Any, Callable, Optional
 
 from .cache import SummaryCache
 from .config import HistoryConfig, TruncateStrategy
-from .utils import format_history_for_summary, summarize_history_structure
+from .utils import format_history_for_summary, json_chars, summarize_history_structure
 
 # 模块级日志器
 logger = logging.getLogger("ai_history_manager")
@@ -21,12 +22,157 @@ logger = logging.getLogger("ai_history_manager")
 # 全局摘要缓存
 _summary_cache = SummaryCache()
 
+# 策略位掩码：构造时把策略列表折叠成一个整数，判断时只做一次按位与
+_STRATEGY_BITS = {strategy: 1 << i for i, strategy in enumerate(TruncateStrategy)}
+_AUTO_TRUNCATE = _STRATEGY_BITS[TruncateStrategy.AUTO_TRUNCATE]
+_SMART_SUMMARY = _STRATEGY_BITS[TruncateStrategy.SMART_SUMMARY]
+_ERROR_RETRY = _STRATEGY_BITS[TruncateStrategy.ERROR_RETRY]
+_PRE_ESTIMATE = _STRATEGY_BITS[TruncateStrategy.PRE_ESTIMATE]
+
+# 异步流程中消息数达到该值时，序列化度量放到线程池执行，不阻塞事件循环
+_OFFLOAD_MIN_MESSAGES = 32
+
 
 def get_summary_cache() -> SummaryCache:
     """获取全局摘要缓存实例"""
     return _summary_cache
 
 
+# 摘要提示词模板（中间插入格式化后的历史）
+_SUMMARY_PROMPT_HEAD = """请简洁地总结以下对话历史的关键信息，包括：
+1. 用户的主要目标和需求
+2. 已完成的重要操作
+3. 当前的工作状态和上下文
+
+对话历史：
+"""
+_SUMMARY_PROMPT_TAIL = """
+
+请用中文输出摘要，控制在 {max_length} 字符以内："""
+
+# 摘要后占位 assistant 消息的内容
+_SUMMARY_ACK = "I understand the context. Let's continue."
+
+# 批量摘要：单批最多合并的请求数、等待凑批的最长时间（秒）
+_SUMMARY_BATCH_MAX = 8
+_SUMMARY_BATCH_WAIT = 0.05
+
+
+def _is_kiro_format(history: list[dict]) -> bool:
+    """判断历史是否为 Kiro 格式
+
+    同一历史中的消息格式一致，通常看第一条即可判定；
+    第一条既不是 Kiro 消息也没有 role 字段时才逐条检查。
+    """
+    if not history:
+        return False
+    first = history[0]
+    if "userInputMessage" in first or "assistantResponseMessage" in first:
+        return True
+    if "role" in first:
+        return False
+    return any("userInputMessage" in h or "assistantResponseMessage" in h for h in history)
+
+
+def _measure_scope(method: Callable) -> Callable:
+    """尺寸缓存只在一次公开调用内有效
+
+    缓存以对象 id 为键，跨调用保留会在消息被原地修改后返回过期尺寸，
+    并长期持有调用方的列表。嵌套的公开调用共享缓存，最外层调用返回时清空。
+    """
+    if asyncio.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def async_wrapper(self: "HistoryManager", *args: Any, **kwargs: Any) -> Any:
+            self._measure_depth += 1
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                self._leave_measure_scope()
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self: "HistoryManager", *args: Any, **kwargs: Any) -> Any:
+        self._measure_depth += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._leave_measure_scope()
+
+    return wrapper
+
+
+class _SummaryBatcher:
+    """摘要请求合并器
+
+    只对声明了 ``__batch__ = True`` 的摘要生成函数生效：这类函数签名为
+    async (prompts: list[str]) -> list[str]。短时间窗口内（或凑满一批时）
+    提交的多个提示词合并为一次调用，便于后端（如 vLLM 连续批处理）统一调度。
+    """
+
+    def __init__(self, max_batch: int = _SUMMARY_BATCH_MAX, max_wait: float = _SUMMARY_BATCH_WAIT):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # (事件循环, 生成函数) -> [(提示词, Future)]
+        self._pending: dict[tuple[Any, Callable], list[tuple[str, asyncio.Future]]] = {}
+        # (事件循环, 生成函数) -> 当前批次的等待定时器，提前凑满时取消
+        self._timers: dict[tuple[Any, Callable], asyncio.TimerHandle] = {}
+        # 持有运行中的批次任务引用，避免被垃圾回收
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, summary_generator: Callable, prompt: str) -> Any:
+        """提交一个提示词，等待所在批次完成后返回对应结果"""
+        loop = asyncio.get_running_loop()
+        key = (loop, summary_generator)
+        future = loop.create_future()
+
+        bucket = self._pending.setdefault(key, [])
+        bucket.append((prompt, future))
+        if len(bucket) >= self.max_batch:
+            self._flush(key)
+        elif len(bucket) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: tuple[Any, Callable]) -> None:
+        # 凑满提前发出时取消等待定时器，避免它稍后把同键的下一批过早发出
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        bucket = self._pending.pop(key, None)
+        if bucket:
+            task = key[0].create_task(self._run(key[1], bucket))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self, summary_generator: Callable, bucket: list[tuple[str, asyncio.Future]]
+    ) -> None:
+        error: Exception = RuntimeError("批量摘要任务未完成")
+        try:
+            results = await summary_generator([prompt for prompt, _ in bucket])
+            if len(results) != len(bucket):
+                raise ValueError(
+                    f"批量摘要返回 {len(results)} 条结果，期望 {len(bucket)} 条"
+                )
+            for (_, future), result in zip(bucket, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            error = e
+        finally:
+            # 任务被取消等非 Exception 异常也要通知等待方，避免其永远挂起
+            for _, future in bucket:
+                if not future.done():
+                    future.set_exception(error)
+
+
+# 全局摘要合并器
+_summary_batcher = _SummaryBatcher()
+
+
 class HistoryManager:
     """历史消息管理器
 
@@ -72,6 +218,30 @@ class HistoryManager:
         self._truncated = False
         self._truncate_info = ""
         self.cache_key = cache_key
+        # 历史列表序列化字符数缓存: id(list) -> (list, 长度, 末条消息, 字符数)
+        # 仅在公开方法调用期间生效（见 _measure_scope）
+        self._size_cache: dict[int, tuple[list[dict], int, Optional[dict], int]] = {}
+        # 单条消息序列化字符数缓存: id(msg) -> (msg, 字符数)；切片与原列表共享消息对象
+        self._msg_size_cache: dict[int, tuple[dict, int]] = {}
+        # 当前嵌套的公开调用层数，为 0 时不使用尺寸缓存
+        self._measure_depth = 0
+        # 正在后台刷新的摘要缓存键，避免同一键重复刷新
+        self._refreshing_keys: set[str] = set()
+        # 持有后台刷新任务引用，避免被垃圾回收
+        self._background_tasks: set[asyncio.Task] = set()
+        # 启用策略的位掩码（HistoryConfig 不可变，构造时计算一次）
+        self._strategy_mask = 0
+        for strategy in self.config.strategies:
+            self._strategy_mask |= _STRATEGY_BITS[strategy]
+        # 估算用的常量只依赖配置，预先计算（除法换成乘法）
+        # （非正数属于无效配置，由 validate() 报告，这里不在构造时抛错）
+        cpt = float(self.config.chars_per_token)
+        self._inv_chars_per_token = 1.0 / cpt if cpt > 0 else 0.0
+        self._pre_estimate_target = int(self.config.estimate_threshold * 0.8)  # 留 20% 余量
+        # 摘要提示词尾部只依赖配置，预先生成
+        self._prompt_tail = _SUMMARY_PROMPT_TAIL.format(
+            max_length=self.config.summary_max_length
+        )
 
         # 配置日志
         if self.config.logging_enabled:
@@ -93,6 +263,13 @@ class HistoryManager:
         self._truncated = False
         self._truncate_info = ""
 
+    def _leave_measure_scope(self) -> None:
+        """退出一层公开调用，最外层退出时清空尺寸缓存"""
+        self._measure_depth -= 1
+        if not self._measure_depth:
+            self._size_cache.clear()
+            self._msg_size_cache.clear()
+
     def set_cache_key(self, cache_key: Optional[str]) -> None:
         """设置摘要缓存键
 
@@ -107,6 +284,76 @@ class HistoryManager:
             return None
         return f"{self.cache_key}:{target_count}"
 
+    def _history_chars(self, history: list[dict]) -> int:
+        """历史消息序列化后的字符数
+
+        同一次处理中同一个列表会被多个判断方法反复度量，这里按列表对象缓存结果，
+        以列表长度和末条消息对象校验（追加/截断后自动重新计算）。
+        缓存只在一次公开调用内有效，调用之间原地修改消息不会得到过期尺寸。
+
+        Args:
+            history: 历史消息列表
+
+        Returns:
+            json.dumps(history, ensure_ascii=False) 的字符数
+        """
+        scoped = self._measure_depth > 0
+        if scoped:
+            cached = self._size_cache.get(id(history))
+            if cached is not None:
+                ref, count, last, chars = cached
+                if ref is history and count == len(history) and (not count or last is history[-1]):
+                    return chars
+
+        # JSON 数组 = "[" + 各消息以 ", " 连接 + "]"，即各消息字符数之和 + 2n
+        chars = sum(self._message_sizes(history)) + 2 * len(history) if history else 2
+        if not scoped:
+            return chars
+        self._size_cache[id(history)] = (
+            history,
+            len(history),
+            history[-1] if history else None,
+            chars,
+        )
+        return chars
+
+    def _message_sizes(self, history: list[dict]) -> list[int]:
+        """每条消息序列化后的字符数
+
+        公开调用期间按消息对象缓存：旧历史/最近历史等切片与原列表共享消息对象，
+        整体、切片和逐条度量都只序列化每条消息一次。
+
+        Args:
+            history: 历史消息列表
+
+        Returns:
+            与 history 一一对应的字符数列表
+        """
+        if not self._measure_depth:
+            return [json_chars(msg) for msg in history]
+
+        cache = self._msg_size_cache
+        sizes = []
+        append = sizes.append
+        for msg in history:
+            hit = cache.get(id(msg))
+            if hit is not None and hit[0] is msg:
+                append(hit[1])
+            else:
+                size = json_chars(msg)
+                cache[id(msg)] = (msg, size)
+                append(size)
+        return sizes
+
+    async def _measure_off_loop(self, history: list[dict]) -> None:
+        """在线程池中预先计算消息尺寸
+
+        大历史的序列化可能耗时数十毫秒，放到线程中执行以免阻塞其他协程；
+        结果写入本次调用的消息尺寸缓存，后续的判断方法直接命中缓存。
+        """
+        if len(history) >= _OFFLOAD_MIN_MESSAGES:
+            await asyncio.to_thread(self._message_sizes, history)
+
     # ==================== 估算方法 ====================
 
     def estimate_tokens(self, text: str) -> int:
@@ -118,8 +365,9 @@ class HistoryManager:
         Returns:
             估算的 token 数
         """
-        return int(len(text) / self.config.chars_per_token)
+        return int(len(text) * self._inv_chars_per_token)
 
+    @_measure_scope
     def estimate_history_size(self, history: list[dict]) -> tuple[int, int]:
         """估算历史消息大小
 
@@ -129,9 +377,10 @@ class HistoryManager:
         Returns:
             (消息数, 字符数)
         """
-        char_count = len(json.dumps(history, ensure_ascii=False))
+        char_count = self._history_chars(history)
         return len(history), char_count
 
+    @_measure_scope
     def estimate_request_chars(
         self, history: list[dict], user_content: str = ""
     ) -> tuple[int, int, int]:
@@ -144,7 +393,7 @@ class HistoryManager:
         Returns:
             (历史字符数, 用户消息字符数, 总字符数)
         """
-        history_chars = len(json.dumps(history, ensure_ascii=False))
+        history_chars = self._history_chars(history)
         user_chars = len(user_content or "")
         return history_chars, user_chars, history_chars + user_chars
 
@@ -175,6 +424,7 @@ class HistoryManager:
 
         return truncated
 
+    @_measure_scope
     def truncate_by_chars(self, history: list[dict], max_chars: int) -> list[dict]:
         """按字符数截断
 
@@ -187,20 +437,34 @@ class HistoryManager:
         Returns:
             截断后的历史消息
         """
-        total_chars = len(json.dumps(history, ensure_ascii=False))
+        return self._truncate_by_chars_sz(history, max_chars)[0]
+
+    def _truncate_by_chars_sz(self, history: list[dict], max_chars: int) -> tuple[list[dict], int]:
+        """按字符数截断，同时返回截断结果的序列化字符数
+
+        截断时已经累计出保留部分的大小，调用方据此做后续判断，无需再度量一次。
+
+        Returns:
+            (截断后的历史消息, 截断后历史的字符数)
+        """
+        total_chars = self._history_chars(history)
         if total_chars <= max_chars:
-            return history
+            return history, total_chars
 
         original_count = len(history)
-        result = []
+        sizes = self._message_sizes(history)
         current_chars = 0
+        cut = original_count
 
-        for msg in reversed(history):
-            msg_chars = len(json.dumps(msg, ensure_ascii=False))
-            if current_chars + msg_chars > max_chars and result:
+        # 从后往前找到保留区间的起点，最后一次切片（至少保留最后一条消息）
+        for i in range(original_count - 1, -1, -1):
+            msg_chars = sizes[i]
+            if current_chars + msg_chars > max_chars and cut < original_count:
                 break
-            result.insert(0, msg)
             current_chars += msg_chars
+            cut = i
+
+        result = history[cut:]
 
         if len(result) < original_count:
             self._truncated = True
@@ -212,7 +476,8 @@ class HistoryManager:
             if self.config.logging_enabled:
                 logger.info(self._truncate_info)
 
-        return result
+        # JSON 数组 = 各消息字符数 + ", " 分隔符与方括号（result 至少含一条消息）
+        return result, current_chars + 2 * len(result)
 
     # ==================== 摘要方法 ====================
 
@@ -225,7 +490,9 @@ class HistoryManager:
 
         Args:
             history: 需要摘要的历史消息
-            summary_generator: 摘要生成函数，签名为 async (prompt: str) -> str
+            summary_generator: 摘要生成函数，签名为 async (prompt: str) -> str；
+                声明 ``__batch__ = True`` 时签名为 async (prompts: list[str]) -> list[str]，
+                并发的摘要请求会被合并为一次调用
 
         Returns:
             摘要文本，失败返回 None
@@ -233,29 +500,22 @@ class HistoryManager:
         if not history:
             return None
 
-        formatted = format_history_for_summary(history)
-        # 限制输入长度
-        if len(formatted) > 10000:
-            formatted = formatted[:10000] + "\n...(truncated)"
-
-        prompt = f"""请简洁地总结以下对话历史的关键信息，包括：
-1. 用户的主要目标和需求
-2. 已完成的重要操作
-3. 当前的工作状态和上下文
-
-对话历史：
-{formatted}
+        # 限制输入长度（超出上限后不再格式化更早之后的消息）
+        formatted = format_history_for_summary(history, max_chars=10000)
 
-请用中文输出摘要，控制在 {self.config.summary_max_length} 字符以内："""
+        prompt = "".join((_SUMMARY_PROMPT_HEAD, formatted, self._prompt_tail))
 
         try:
-            summary = await summary_generator(prompt)
+            if getattr(summary_generator, "__batch__", False):
+                summary = await _summary_batcher.submit(summary_generator, prompt)
+            else:
+                summary = await summary_generator(prompt)
             if summary and len(summary) > self.config.summary_max_length:
                 summary = summary[: self.config.summary_max_length] + "..."
             return summary
         except Exception as e:
             if self.config.logging_enabled:
-                logger.warning(f"生成摘要失败: {e}")
+                logger.warning("生成摘要失败: %s", e)
             return None
 
     def _build_summary_history(
@@ -280,12 +540,7 @@ class HistoryManager:
         Returns:
             构建好的历史消息列表
         """
-        # 检查是否为 Kiro 格式
-        is_kiro_format = any(
-            "userInputMessage" in h or "assistantResponseMessage" in h for h in recent_history
-        )
-
-        if is_kiro_format:
+        if _is_kiro_format(recent_history):
             return self._build_summary_history_kiro(summary, recent_history, debug_label)
         else:
             return self._build_summary_history_standard(summary, recent_history, debug_label)
@@ -301,15 +556,6 @@ class HistoryManager:
         if recent_history and "assistantResponseMessage" in recent_history[0]:
             recent_history = recent_history[1:]
 
-        # 收集所有 toolUse IDs
-        tool_use_ids = set()
-        for msg in recent_history:
-            if "assistantResponseMessage" in msg:
-                for tu in msg["assistantResponseMessage"].get("toolUses", []) or []:
-                    tu_id = tu.get("toolUseId")
-                    if tu_id:
-                        tool_use_ids.add(tu_id)
-
         # 检查第一条 user 消息是否有 toolResults
         if recent_history and "userInputMessage" in recent_history[0]:
             ctx = recent_history[0].get("userInputMessage", {}).get("userInputMessageContext", {})
@@ -317,34 +563,43 @@ class HistoryManager:
                 # 清除，因为摘要后的 assistant 占位消息没有 toolUses
                 recent_history[0]["userInputMessage"].pop("userInputMessageContext", None)
 
-        # 重新收集 tool_use_ids（因为可能已经修改了 recent_history）
+        # 一次遍历收集所有 toolUse IDs，并记录 user 消息供下面过滤
+        # （上一步只修改 user 消息，不影响收集到的 IDs）
         tool_use_ids = set()
+        add_id = tool_use_ids.add
+        user_inputs = []
         for msg in recent_history:
-            if "assistantResponseMessage" in msg:
-                for tu in msg["assistantResponseMessage"].get("toolUses", []) or []:
+            assistant = msg.get("assistantResponseMessage")
+            if assistant is not None:
+                for tu in assistant.get("toolUses") or ():
                     tu_id = tu.get("toolUseId")
                     if tu_id:
-                        tool_use_ids.add(tu_id)
+                        add_id(tu_id)
+            user_input = msg.get("userInputMessage")
+            if user_input is not None:
+                user_inputs.append(user_input)
 
         # 过滤孤立的 toolResults
         if tool_use_ids:
-            for msg in recent_history:
-                if "userInputMessage" in msg:
-                    ctx = msg.get("userInputMessage", {}).get("userInputMessageContext", {})
-                    results = ctx.get("toolResults")
-                    if results:
-                        filtered = [r for r in results if r.get("toolUseId") in tool_use_ids]
-                        if filtered:
-                            ctx["toolResults"] = filtered
-                        else:
-                            ctx.pop("toolResults", None)
-                        if not ctx:
-                            msg["userInputMessage"].pop("userInputMessageContext", None)
+            for user_input in user_inputs:
+                ctx = user_input.get("userInputMessageContext", {})
+                results = ctx.get("toolResults")
+                if results:
+                    filtered = [r for r in results if r.get("toolUseId") in tool_use_ids]
+                    if filtered:
+                        ctx["toolResults"] = filtered
+                    else:
+                        ctx.pop("toolResults", None)
+                    if not ctx:
+                        user_input.pop("userInputMessageContext", None)
         else:
             # 没有任何 toolUses，清除所有 toolResults
-            for msg in recent_history:
-                if "userInputMessage" in msg:
-                    msg["userInputMessage"].pop("userInputMessageContext", None)
+            for user_input in user_inputs:
+                user_input.pop("userInputMessageContext", None)
+
+        # 上面可能原地修改了消息（与原历史共享），本次调用内已缓存的尺寸不再可信
+        self._size_cache.clear()
+        self._msg_size_cache.clear()
 
         # 获取模型 ID
         model_id = "claude-sonnet-4"
@@ -364,13 +619,16 @@ class HistoryManager:
                 "origin": "AI_EDITOR",
             }
         }
-        result = [summary_msg]
-        # 占位 assistant 消息（没有 toolUses）
-        result.append({"assistantResponseMessage": {"content": "I understand the context. Let's continue."}})
-        result.extend(recent_history)
+        result = [
+            summary_msg,
+            # 占位 assistant 消息（没有 toolUses）
+            {"assistantResponseMessage": {"content": _SUMMARY_ACK}},
+            *recent_history,
+        ]
 
-        if debug_label and self.config.logging_enabled:
-            logger.debug(f"[{debug_label}]: {summarize_history_structure(result)}")
+        # 结构摘要需要遍历整个历史，仅在 DEBUG 级别开启时才生成
+        if debug_label and self.config.logging_enabled and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[%s]: %s", debug_label, summarize_history_structure(result))
 
         return result
 
@@ -385,15 +643,20 @@ class HistoryManager:
             "role": "user",
             "content": f"[Earlier conversation summary]\n{summary}\n\n[Continuing from recent messages...]",
         }
-        result = [summary_msg]
-        result.append({"role": "assistant", "content": "I understand the context. Let's continue."})
-        result.extend(recent_history)
+        # 一次构造结果列表；占位消息每次新建，避免调用方修改时互相影响
+        result = [
+            summary_msg,
+            {"role": "assistant", "content": _SUMMARY_ACK},
+            *recent_history,
+        ]
 
-        if debug_label and self.config.logging_enabled:
-            logger.debug(f"[{debug_label}]: {summarize_history_structure(result)}")
+        # 结构摘要需要遍历整个历史，仅在 DEBUG 级别开启时才生成
+        if debug_label and self.config.logging_enabled and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[%s]: %s", debug_label, summarize_history_structure(result))
 
         return result
 
+    @_measure_scope
     async def compress_with_summary(
         self,
         history: list[dict],
@@ -408,7 +671,7 @@ class HistoryManager:
         Returns:
             压缩后的历史消息
         """
-        total_chars = len(json.dumps(history, ensure_ascii=False))
+        total_chars = self._history_chars(history)
         if total_chars <= self.config.summary_threshold:
             return history
 
@@ -442,8 +705,82 @@ class HistoryManager:
 
         return result
 
+    def _get_cached_summary(
+        self,
+        cache_key: str,
+        old_history: list[dict],
+        old_count: int,
+        old_chars: int,
+        summary_generator: Callable[[str], Any],
+    ) -> Optional[str]:
+        """查询摘要缓存
+
+        开启 summary_cache_serve_stale 时，仅因超时而过期的摘要直接返回，
+        同时在后台重新生成并写回缓存，避免当前请求等待摘要生成；
+        没有运行中的事件循环时改为同步重新生成。
+
+        Returns:
+            缓存的摘要，未命中返回 None
+        """
+        config = self.config
+        if not config.summary_cache_serve_stale:
+            return _summary_cache.get(
+                cache_key,
+                old_count,
+                old_chars,
+                config.summary_cache_min_delta_messages,
+                config.summary_cache_min_delta_chars,
+                config.summary_cache_max_age_seconds,
+            )
+
+        cached, stale = _summary_cache.get_with_stale(
+            cache_key,
+            old_count,
+            old_chars,
+            config.summary_cache_min_delta_messages,
+            config.summary_cache_min_delta_chars,
+            config.summary_cache_max_age_seconds,
+        )
+        if cached and stale and cache_key not in self._refreshing_keys:
+            self._refreshing_keys.add(cache_key)
+            refresh = self._refresh_summary(
+                cache_key, old_history, old_count, old_chars, summary_generator
+            )
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # 没有运行中的事件循环（同步调用）：就地重新生成，失败时仍返回旧摘要
+                return asyncio.run(refresh) or cached
+
+            task = loop.create_task(refresh)
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        return cached
+
+    async def _refresh_summary(
+        self,
+        cache_key: str,
+        old_history: list[dict],
+        old_count: int,
+        old_chars: int,
+        summary_generator: Callable[[str], Any],
+    ) -> Optional[str]:
+        """重新生成摘要并写回缓存
+
+        Returns:
+            新摘要，生成失败返回 None
+        """
+        try:
+            summary = await self.generate_summary(old_history, summary_generator)
+            if summary:
+                _summary_cache.set(cache_key, summary, old_count, old_chars)
+            return summary
+        finally:
+            self._refreshing_keys.discard(cache_key)
+
     # ==================== 判断方法 ====================
 
+    @_measure_scope
     def should_pre_truncate(self, history: list[dict], user_content: str) -> bool:
         """检查是否需要预截断
 
@@ -454,12 +791,13 @@ class HistoryManager:
         Returns:
             是否需要预截断
         """
-        if TruncateStrategy.PRE_ESTIMATE not in self.config.strategies:
+        if not self._strategy_mask & _PRE_ESTIMATE:
             return False
 
-        total_chars = len(json.dumps(history, ensure_ascii=False)) + len(user_content)
+        total_chars = self._history_chars(history) + len(user_content)
         return total_chars > self.config.estimate_threshold
 
+    @_measure_scope
     def should_summarize(self, history: list[dict]) -> bool:
         """检查是否需要摘要
 
@@ -471,6 +809,7 @@ class HistoryManager:
         """
         return self.should_smart_summarize(history) or self.should_auto_truncate_summarize(history)
 
+    @_measure_scope
     def should_smart_summarize(self, history: list[dict]) -> bool:
         """检查是否需要智能摘要
 
@@ -480,15 +819,15 @@ class HistoryManager:
         Returns:
             是否需要智能摘要
         """
-        if TruncateStrategy.SMART_SUMMARY not in self.config.strategies:
+        if not self._strategy_mask & _SMART_SUMMARY:
             return False
 
-        total_chars = len(json.dumps(history, ensure_ascii=False))
-        return (
-            total_chars > self.config.summary_threshold
-            and len(history) > self.config.summary_keep_recent
-        )
+        # 先做不需要序列化的消息数判断，不满足时无需度量字符数
+        if len(history) <= self.config.summary_keep_recent:
+            return False
+        return self._history_chars(history) > self.config.summary_threshold
 
+    @_measure_scope
     def should_auto_truncate_summarize(self, history: list[dict]) -> bool:
         """检查是否需要自动截断前摘要
 
@@ -498,15 +837,18 @@ class HistoryManager:
         Returns:
             是否需要自动截断前摘要
         """
-        if TruncateStrategy.AUTO_TRUNCATE not in self.config.strategies:
+        if not self._strategy_mask & _AUTO_TRUNCATE:
             return False
 
         if len(history) <= 1:
             return False
 
-        total_chars = len(json.dumps(history, ensure_ascii=False))
-        return len(history) > self.config.max_messages or total_chars > self.config.max_chars
+        # 消息数已超限时无需度量字符数
+        if len(history) > self.config.max_messages:
+            return True
+        return self._history_chars(history) > self.config.max_chars
 
+    @_measure_scope
     def should_pre_summary_for_error_retry(self, history: list[dict], user_content: str = "") -> bool:
         """检查是否需要错误重试前预摘要
 
@@ -517,7 +859,7 @@ class HistoryManager:
         Returns:
             是否需要预摘要
         """
-        if TruncateStrategy.ERROR_RETRY not in self.config.strategies:
+        if not self._strategy_mask & _ERROR_RETRY:
             return False
         if not history:
             return False
@@ -526,6 +868,7 @@ class HistoryManager:
 
     # ==================== 预处理方法 ====================
 
+    @_measure_scope
     def pre_process(self, history: list[dict], user_content: str = "") -> list[dict]:
         """预处理历史消息（同步版本，不包含摘要）
 
@@ -546,19 +889,22 @@ class HistoryManager:
         result = history
 
         # 策略 1: 自动截断
-        if TruncateStrategy.AUTO_TRUNCATE in self.config.strategies:
+        result_chars: Optional[int] = None
+        if self._strategy_mask & _AUTO_TRUNCATE:
             result = self.truncate_by_count(result, self.config.max_messages)
-            result = self.truncate_by_chars(result, self.config.max_chars)
+            result, result_chars = self._truncate_by_chars_sz(result, self.config.max_chars)
 
         # 策略 4: 预估检测
-        if TruncateStrategy.PRE_ESTIMATE in self.config.strategies:
-            total_chars = len(json.dumps(result, ensure_ascii=False)) + len(user_content)
+        if self._strategy_mask & _PRE_ESTIMATE:
+            if result_chars is None:
+                result_chars = self._history_chars(result)
+            total_chars = result_chars + len(user_content)
             if total_chars > self.config.estimate_threshold:
-                target_chars = int(self.config.estimate_threshold * 0.8)  # 留 20% 余量
-                result = self.truncate_by_chars(result, target_chars)
+                result = self.truncate_by_chars(result, self._pre_estimate_target)
 
         return result
 
+    @_measure_scope
     async def pre_process_async(
         self,
         history: list[dict],
@@ -580,11 +926,14 @@ class HistoryManager:
         if not history:
             return history
 
+        if summary_generator or self._strategy_mask & (_AUTO_TRUNCATE | _PRE_ESTIMATE):
+            await self._measure_off_loop(history)
+
         result = history
         pre_summarized = False
 
         # 错误重试预摘要（避免首次请求直接超限）
-        if TruncateStrategy.ERROR_RETRY in self.config.strategies and summary_generator:
+        if self._strategy_mask & _ERROR_RETRY and summary_generator:
             if self.should_pre_summary_for_error_retry(result, user_content):
                 target_count = self.config.retry_max_messages
                 if len(result) > target_count:
@@ -593,18 +942,15 @@ class HistoryManager:
 
                     # 尝试从缓存获取
                     cache_key = self._summary_cache_key(target_count)
+                    use_cache = bool(cache_key and self.config.summary_cache_enabled)
                     old_count = len(old_history)
-                    old_chars = len(json.dumps(old_history, ensure_ascii=False))
+                    # 字符数只用于缓存校验，未启用缓存时不必序列化
+                    old_chars = self._history_chars(old_history) if use_cache else 0
 
                     cached = None
-                    if cache_key and self.config.summary_cache_enabled:
-                        cached = _summary_cache.get(
-                            cache_key,
-                            old_count,
-                            old_chars,
-                            self.config.summary_cache_min_delta_messages,
-                            self.config.summary_cache_min_delta_chars,
-                            self.config.summary_cache_max_age_seconds,
+                    if use_cache:
+                        cached = self._get_cached_summary(
+                            cache_key, old_history, old_count, old_chars, summary_generator
                         )
 
                     if cached:
@@ -628,19 +974,19 @@ class HistoryManager:
                                 f"(摘要 {len(summary)} 字符)"
                             )
                             pre_summarized = True
-                            if cache_key and self.config.summary_cache_enabled:
+                            if use_cache:
                                 _summary_cache.set(cache_key, summary, old_count, old_chars)
 
         # 策略 2: 智能摘要
         summary_applied = False
-        if TruncateStrategy.SMART_SUMMARY in self.config.strategies and summary_generator:
+        if self._strategy_mask & _SMART_SUMMARY and summary_generator:
             if self.should_smart_summarize(result) and not pre_summarized:
                 result = await self.compress_with_summary(result, summary_generator)
                 summary_applied = True
 
         # 自动截断前摘要
         if (
-            TruncateStrategy.AUTO_TRUNCATE in self.config.strategies
+            self._strategy_mask & _AUTO_TRUNCATE
             and summary_generator
             and not summary_applied
             and self.should_auto_truncate_summarize(result)
@@ -664,21 +1010,51 @@ class HistoryManager:
                         )
 
         # 策略 1: 自动截断
-        if TruncateStrategy.AUTO_TRUNCATE in self.config.strategies:
+        result_chars: Optional[int] = None
+        if self._strategy_mask & _AUTO_TRUNCATE:
             result = self.truncate_by_count(result, self.config.max_messages)
-            result = self.truncate_by_chars(result, self.config.max_chars)
+            result, result_chars = self._truncate_by_chars_sz(result, self.config.max_chars)
 
         # 策略 4: 预估检测
-        if TruncateStrategy.PRE_ESTIMATE in self.config.strategies:
-            total_chars = len(json.dumps(result, ensure_ascii=False)) + len(user_content)
+        if self._strategy_mask & _PRE_ESTIMATE:
+            if result_chars is None:
+                result_chars = self._history_chars(result)
+            total_chars = result_chars + len(user_content)
             if total_chars > self.config.estimate_threshold:
-                target_chars = int(self.config.estimate_threshold * 0.8)
-                result = self.truncate_by_chars(result, target_chars)
+                result = self.truncate_by_chars(result, self._pre_estimate_target)
 
         return result
 
     # ==================== 错误处理方法 ====================
 
+    # 错误重试按数量截断的提示信息模板
+    _RETRY_TRUNCATE_INFO = "错误重试截断 (第 {attempt} 次): {before} -> {after} 条消息"
+
+    def _fallback_truncate(
+        self, history: list[dict], target_count: int, retry_count: int
+    ) -> tuple[list[dict], bool]:
+        """错误重试兜底：按数量截断
+
+        Args:
+            history: 历史消息列表
+            target_count: 保留的消息数
+            retry_count: 当前重试次数
+
+        Returns:
+            (截断后的历史, 是否应该重试)
+        """
+        self.reset()
+        truncated = self.truncate_by_count(history, target_count)
+        if len(truncated) < len(history):
+            self._truncate_info = self._RETRY_TRUNCATE_INFO.format(
+                attempt=retry_count + 1, before=len(history), after=len(truncated)
+            )
+            if self.config.logging_enabled:
+                logger.info(self._truncate_info)
+            return truncated, True
+
+        return history, False
+
     def handle_length_error(
         self, history: list[dict], retry_count: int = 0
     ) -> tuple[list[dict], bool]:
@@ -691,7 +1067,7 @@ class HistoryManager:
         Returns:
             (截断后的历史, 是否应该重试)
         """
-        if TruncateStrategy.ERROR_RETRY not in self.config.strategies:
+        if not self._strategy_mask & _ERROR_RETRY:
             return history, False
 
         if retry_count >= self.config.max_retries:
@@ -701,20 +1077,9 @@ class HistoryManager:
         factor = 1.0 - (retry_count * 0.3)  # 每次减少 30%
         target_count = max(5, int(self.config.retry_max_messages * factor))
 
-        self.reset()
-        truncated = self.truncate_by_count(history, target_count)
-
-        if len(truncated) < len(history):
-            self._truncate_info = (
-                f"错误重试截断 (第 {retry_count + 1} 次): "
-                f"{len(history)} -> {len(truncated)} 条消息"
-            )
-            if self.config.logging_enabled:
-                logger.info(self._truncate_info)
-            return truncated, True
-
-        return history, False
+        return self._fallback_truncate(history, target_count, retry_count)
 
+    @_measure_scope
     async def handle_length_error_async(
         self,
         history: list[dict],
@@ -731,7 +1096,7 @@ class HistoryManager:
         Returns:
             (处理后的历史, 是否应该重试)
         """
-        if TruncateStrategy.ERROR_RETRY not in self.config.strategies:
+        if not self._strategy_mask & _ERROR_RETRY:
             return history, False
 
         if retry_count >= self.config.max_retries:
@@ -754,19 +1119,19 @@ class HistoryManager:
             recent_history = history[-target_count:]
 
             cache_key = self._summary_cache_key(target_count)
+            use_cache = bool(cache_key and self.config.summary_cache_enabled)
             old_count = len(old_history)
-            old_chars = len(json.dumps(old_history, ensure_ascii=False))
+            # 字符数只用于缓存校验，未启用缓存时不必序列化
+            old_chars = 0
+            if use_cache:
+                await self._measure_off_loop(old_history)
+                old_chars = self._history_chars(old_history)
 
             # 尝试从缓存获取
             cached = None
-            if cache_key and self.config.summary_cache_enabled:
-                cached = _summary_cache.get(
-                    cache_key,
-                    old_count,
-                    old_chars,
-                    self.config.summary_cache_min_delta_messages,
-                    self.config.summary_cache_min_delta_chars,
-                    self.config.summary_cache_max_age_seconds,
+            if use_cache:
+                cached = self._get_cached_summary(
+                    cache_key, old_history, old_count, old_chars, summary_generator
                 )
 
             if cached:
@@ -789,25 +1154,14 @@ class HistoryManager:
                     f"错误重试摘要 (第 {retry_count + 1} 次): "
                     f"{len(history)} -> {len(result)} 条消息 (摘要 {len(summary)} 字符)"
                 )
-                if cache_key and self.config.summary_cache_enabled:
+                if use_cache:
                     _summary_cache.set(cache_key, summary, old_count, old_chars)
                 if self.config.logging_enabled:
                     logger.info(self._truncate_info)
                 return result, True
 
         # 摘要失败或无 summary_generator，回退到按数量截断
-        self.reset()
-        truncated = self.truncate_by_count(history, target_count)
-        if len(truncated) < len(history):
-            self._truncate_info = (
-                f"错误重试截断 (第 {retry_count + 1} 次): "
-                f"{len(history)} -> {len(truncated)} 条消息"
-            )
-            if self.config.logging_enabled:
-                logger.info(self._truncate_info)
-            return truncated, True
-
-        return history, False
+        return self._fallback_truncate(history, target_count, retry_count)
 
     # ==================== 工具方法 ====================
 
@@ -3,6 +3,8 @@
 提供低侵入性的历史消息管理中间件，自动处理请求中的消息历史。
 """
 
+import functools
+import hashlib
 import json
 import logging
 import re
@@ -17,8 +19,89 @@ from ..config import HistoryConfig, TruncateStrategy, load_config_from_file
 from ..manager import HistoryManager
 from ..utils import is_content_length_error
 
+try:
+    import orjson  # 可选加速（pip install ai-history-manager[fast]）
+
+    # 19 位以上的数字串可能超出 64 位整数范围：orjson 解析时会静默转成浮点数，
+    # 序列化时则直接报错，这类请求体统一交给标准库处理
+    _LONG_DIGITS = re.compile(rb'\d{19}')
+
+    def _loads_body(body: bytes) -> Any:
+        """解析请求体
+
+        orjson 直接解析 bytes，省去 decode 拷贝；
+        orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，异常处理无需区分。
+        """
+        if _LONG_DIGITS.search(body):
+            return json.loads(body)
+        return orjson.loads(body)
+
+    def _dumps_body(body: Any) -> bytes:
+        """序列化请求体，orjson 无法表示的大整数回退到标准库"""
+        try:
+            return orjson.dumps(body)
+        except orjson.JSONEncodeError:
+            return json.dumps(body).encode()
+
+except ImportError:
+    _loads_body = json.loads
+
+    def _dumps_body(body: Any) -> bytes:
+        return json.dumps(body).encode()
+
 logger = logging.getLogger("ai_history_manager.middleware")
 
+# 重放请求体时每个 ASGI 消息携带的最大字节数
+_RECEIVE_CHUNK = 64 * 1024
+
+
+def _is_json_request(scope: Scope) -> bool:
+    """根据 Content-Type 判断请求体是否可能是 JSON
+
+    与 FastAPI 的判断一致：缺省视为 JSON，否则要求 application/json 或 application/*+json。
+    """
+    for key, value in scope["headers"]:
+        if key == b"content-type":
+            mime = value.split(b";", 1)[0].strip().lower()
+            return mime == b"application/json" or (
+                mime.startswith(b"application/") and mime.endswith(b"+json")
+            )
+    return True
+
+
+def _replay_receive(body: bytes, receive: Receive) -> Receive:
+    """创建重放请求体的 receive 函数
+
+    请求体按 _RECEIVE_CHUNK 分块发送（more_body），下游可以边收边处理；
+    发送完毕后交还原 receive，下游随后收到的是客户端断开等真实事件，
+    而不是反复收到同一份请求体。
+
+    Args:
+        body: 要重放的请求体
+        receive: 原 ASGI receive
+
+    Returns:
+        新的 receive 函数
+    """
+    offset = 0
+    finished = False
+
+    async def replay() -> Message:
+        nonlocal offset, finished
+        if finished:
+            return await receive()
+        # 请求体不超过一块时切片返回原对象，不产生拷贝
+        chunk = body[offset : offset + _RECEIVE_CHUNK]
+        offset += _RECEIVE_CHUNK
+        finished = offset >= len(body)
+        return {
+            "type": "http.request",
+            "body": chunk,
+            "more_body": not finished,
+        }
+
+    return replay
+
 
 class HistoryManagerMiddleware:
     """FastAPI 历史消息管理中间件
@@ -56,6 +139,19 @@ class HistoryManagerMiddleware:
     ```
     """
 
+    # 每个请求都会访问这些属性，slots 走描述符直接取值，且实例不带 __dict__
+    __slots__ = (
+        "app",
+        "config",
+        "summary_generator",
+        "path_pattern",
+        "_match_path",
+        "session_id_extractor",
+        "messages_field",
+        "system_field",
+        "_rewrites_history",
+    )
+
     def __init__(
         self,
         app: ASGIApp,
@@ -91,10 +187,33 @@ class HistoryManagerMiddleware:
 
         self.summary_generator = summary_generator
         self.path_pattern: Pattern = re.compile(path_pattern)
+        anchored = path_pattern.startswith("^")
+        if re.escape(path_pattern) == path_pattern:
+            # 纯字面量模式（如默认的 /v1/messages）：search 等价于子串查找
+            self._match_path: Callable[[str], bool] = lambda path: path_pattern in path
+        elif anchored and re.escape(path_pattern[1:]) == path_pattern[1:]:
+            # "^字面量"：等价于前缀判断
+            prefix = path_pattern[1:]
+            self._match_path = lambda path: path.startswith(prefix)
+        else:
+            # 以 ^ 开头的模式只需从起始位置尝试匹配
+            matcher = self.path_pattern.match if anchored else self.path_pattern.search
+            # 实际请求路径种类很少，缓存匹配结果，避免每个请求都执行正则
+            self._match_path = functools.lru_cache(maxsize=256)(
+                lambda path: matcher(path) is not None
+            )
         self.session_id_extractor = session_id_extractor or self._default_session_id_extractor
         self.messages_field = messages_field
         self.system_field = system_field
 
+        # 中间件只通过截断、预估和智能摘要改写历史；
+        # 仅启用 ERROR_RETRY（默认配置）时请求体不会变化，无需读取和解析
+        strategies = set(self.config.strategies)
+        self._rewrites_history = bool(
+            strategies & {TruncateStrategy.AUTO_TRUNCATE, TruncateStrategy.PRE_ESTIMATE}
+            or (summary_generator and TruncateStrategy.SMART_SUMMARY in strategies)
+        )
+
     def _default_session_id_extractor(self, body: dict) -> str:
         """默认会话 ID 提取器
 
@@ -114,49 +233,48 @@ class HistoryManagerMiddleware:
         # 基于消息内容生成哈希
         messages = body.get(self.messages_field, [])
         if messages:
-            # 使用前几条消息的内容生成哈希
-            content_parts = []
+            # 使用前几条消息的内容生成哈希（逐段 update 等价于对拼接结果取哈希，
+            # 8 字节摘要即 16 位十六进制）
+            digest = hashlib.blake2b(digest_size=8)
+            hashed = False
             for msg in messages[:3]:
                 content = msg.get("content", "")
                 if isinstance(content, str):
-                    content_parts.append(content[:100])
-            if content_parts:
-                import hashlib
-                return hashlib.md5("".join(content_parts).encode()).hexdigest()[:16]
+                    digest.update(content[:100].encode())
+                    hashed = True
+            if hashed:
+                return digest.hexdigest()
 
         return "default"
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """ASGI 入口"""
-        if scope["type"] != "http":
-            await self.app(scope, receive, send)
-            return
-
-        request = Request(scope, receive)
-        path = request.url.path
-
-        # 检查是否需要处理此路径
-        if not self.path_pattern.search(path):
-            await self.app(scope, receive, send)
-            return
-
-        # 只处理 POST 请求
-        if request.method != "POST":
-            await self.app(scope, receive, send)
+        app = self.app
+        # 直接读取 scope 字段判断是否需要处理，不构造 Request / URL 对象；
+        # 依次检查：HTTP、仅处理 POST、配置的策略会改写历史、路径匹配、
+        # 请求体可能是 JSON（multipart 上传等不读取请求体）
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not self._rewrites_history
+            or not self._match_path(scope["path"])
+            or not _is_json_request(scope)
+        ):
+            await app(scope, receive, send)
             return
 
         # 读取请求体
-        body_bytes = await request.body()
+        body_bytes = await Request(scope, receive).body()
         try:
-            body = json.loads(body_bytes)
+            body = _loads_body(body_bytes)
         except json.JSONDecodeError:
-            # 无法解析 JSON，直接传递
-            await self.app(scope, receive, send)
+            # 无法解析 JSON，直接传递（请求体已被读取，需重放给下游）
+            await app(scope, _replay_receive(body_bytes, receive), send)
             return
 
         # 检查是否包含消息字段
         if self.messages_field not in body:
-            await self.app(scope, receive, send)
+            await app(scope, _replay_receive(body_bytes, receive), send)
             return
 
         # 提取会话 ID
@@ -180,6 +298,11 @@ class HistoryManagerMiddleware:
         else:
             processed_history = manager.pre_process(history, user_content)
 
+        # 历史未被改写时直接转发原始请求体，省去重新序列化
+        if not manager.was_truncated:
+            await app(scope, _replay_receive(body_bytes, receive), send)
+            return
+
         # 转换回消息格式
         processed_messages = self._history_to_messages(processed_history)
         body[self.messages_field] = processed_messages
@@ -190,18 +313,15 @@ class HistoryManagerMiddleware:
             logger.info(f"[HistoryManager] {manager.truncate_info}")
 
         # 创建新的请求体
-        new_body = json.dumps(body).encode()
+        new_body = _dumps_body(body)
 
-        # 创建修改后的 receive 函数
-        async def modified_receive() -> Message:
-            return {
-                "type": "http.request",
-                "body": new_body,
-                "more_body": False,
-            }
+        # 请求体长度已变化，同步 Content-Length，避免下游读取时与实际长度不一致
+        headers = MutableHeaders(scope=scope)
+        if "content-length" in headers:
+            headers["content-length"] = str(len(new_body))
 
         # 继续处理请求
-        await self.app(scope, modified_receive, send)
+        await app(scope, _replay_receive(new_body, receive), send)
 
     def _extract_user_content(self, messages: list[dict]) -> str:
         """提取最后一条用户消息的内容
@@ -242,8 +362,9 @@ class HistoryManagerMiddleware:
         Returns:
             历史消息列表
         """
-        # 对于标准 OpenAI/Anthropic 格式，直接返回
-        return messages.copy()
+        # 对于标准 OpenAI/Anthropic 格式，直接返回；
+        # 消息列表来自刚解析的请求体，管理器只切片不原地修改列表，无需复制
+        return messages
 
     def _history_to_messages(self, history: list[dict]) -> list[dict]:
         """将历史格式转换回消息列表
@@ -288,6 +409,8 @@ class RequestInterceptor:
     ```
     """
 
+    __slots__ = ("config", "summary_generator", "messages_field", "_managers")
+
     def __init__(
         self,
         config: Optional[HistoryConfig] = None,
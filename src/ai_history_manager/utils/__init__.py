@@ -1,5 +1,6 @@
 """工具模块"""
 from .error_detection import is_content_length_error, ErrorType
+from .json_size import json_chars
 from .structure import (
     extract_text,
     format_history_for_summary,
@@ -9,6 +10,7 @@ from .structure import (
 __all__ = [
     "is_content_length_error",
     "ErrorType",
+    "json_chars",
     "extract_text",
     "format_history_for_summary",
     "summarize_history_structure",
@@ -3,9 +3,22 @@
 提供内容长度超限错误的检测功能。
 """
 
+import functools
+import re
 from enum import Enum
 from typing import Optional
 
+# 不区分大小写的长度超限关键词；零宽前瞻让相互重叠的关键词也都能被找到
+_KEYWORD_RE = re.compile(
+    r"(?=(maximum context length|too long|input|content|message|context"
+    r"|token|limit|exceed))"
+)
+_TOO_LONG_SUBJECTS = frozenset({"input", "content", "message", "context"})
+_TOKEN_LIMIT_WORDS = frozenset({"limit", "exceed"})
+
+# 参与缓存的错误文本最大长度
+_CACHE_MAX_TEXT = 16 * 1024
+
 
 class ErrorType(str, Enum):
     """错误类型枚举"""
@@ -35,38 +48,44 @@ def is_content_length_error(status_code: int, error_text: str) -> bool:
     if not error_text:
         return False
 
+    # 过长的错误文本不进入缓存，避免长期持有大字符串
+    if len(error_text) > _CACHE_MAX_TEXT:
+        return _scan_length_error(error_text)
+    return _scan_length_error_cached(error_text)
+
+
+def _scan_length_error(error_text: str) -> bool:
+    """扫描错误文本中的长度超限特征（与状态码无关）"""
     # Kiro API 错误
     if "CONTENT_LENGTH_EXCEEDS_THRESHOLD" in error_text:
         return True
 
-    # 通用长度超限关键词
-    if "Input is too long" in error_text:
-        return True
-
     # OpenAI 风格错误
     if "context_length_exceeded" in error_text:
         return True
 
-    if "maximum context length" in error_text.lower():
+    # 其余关键词不区分大小写：一次扫描收集出现过的全部关键词
+    # （"Input is too long" 已被 "too long" + "input" 覆盖）
+    found = set(_KEYWORD_RE.findall(error_text.lower()))
+
+    if "maximum context length" in found:
         return True
 
     # 更宽松的匹配
-    lowered = error_text.lower()
-    if "too long" in lowered and (
-        "input" in lowered
-        or "content" in lowered
-        or "message" in lowered
-        or "context" in lowered
-    ):
+    if "too long" in found and not found.isdisjoint(_TOO_LONG_SUBJECTS):
         return True
 
     # Token 超限
-    if "token" in lowered and ("limit" in lowered or "exceed" in lowered):
+    if "token" in found and not found.isdisjoint(_TOKEN_LIMIT_WORDS):
         return True
 
     return False
 
 
+# 各 API 返回的错误文本大多是固定模板，重复出现时直接命中缓存
+_scan_length_error_cached = functools.lru_cache(maxsize=512)(_scan_length_error)
+
+
 def classify_error(status_code: int, error_text: str) -> ErrorType:
     """分类错误类型
 
@@ -0,0 +1,99 @@
+"""JSON 尺寸度量
+
+历史消息的大小判断只需要序列化后的长度，不需要 JSON 文本本身。
+度量口径为 json.dumps(obj, ensure_ascii=False) 的长度（默认分隔符 ", " / ": "），
+所有按字符数配置的阈值（max_chars、summary_threshold 等）都以此为准。
+安装 orjson 时使用其 C 编码器（pip install ai-history-manager[fast]），
+否则回退到标准库 json。
+"""
+
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于运行环境
+    orjson = None
+
+
+def _stdlib_json_chars(obj: Any) -> int:
+    return len(json.dumps(obj, ensure_ascii=False))
+
+
+def _float_differs(value: float) -> bool:
+    """orjson 与 json.dumps 输出长度可能不同的浮点数
+
+    NaN/Infinity（orjson 输出 null）以及 repr 采用指数形式的数值
+    （绝对值小于 1e-4 或不小于 1e16，两者的指数写法不同，如 1e16 与 1e+16）。
+    """
+    return value != 0.0 and not 1e-4 <= abs(value) < 1e16
+
+
+def _separator_count(obj: Any) -> Optional[int]:
+    """对象序列化时的分隔符（"," 与 ":"）个数
+
+    默认分隔符比紧凑格式每个多一个空格，紧凑长度加上此数即为默认格式长度。
+    只遍历容器节点，字符串内容不参与计算。
+    包含 _float_differs 的浮点数时返回 None，由调用方改用标准库度量。
+    """
+    if isinstance(obj, dict):
+        count = 2 * len(obj) - 1 if obj else 0
+        values = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        count = len(obj) - 1 if obj else 0
+        values = obj
+    else:
+        return None if isinstance(obj, float) and _float_differs(obj) else 0
+
+    for value in values:
+        if isinstance(value, (dict, list, tuple)):
+            nested = _separator_count(value)
+            if nested is None:
+                return None
+            count += nested
+        elif isinstance(value, float) and _float_differs(value):
+            return None
+    return count
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+    def json_chars(obj: Any) -> int:
+        """计算对象序列化为 JSON 后的字符数（与 json.dumps(obj, ensure_ascii=False) 等长）
+
+        orjson 只输出紧凑格式，这里补上默认分隔符中的空格数。
+        NaN/Infinity 与指数形式的浮点数两者输出不同，含这类值的对象交给标准库度量。
+        orjson 输出 UTF-8 字节：纯 ASCII 时字节数即字符数，直接取 len，不创建 str；
+        含多字节字符时才解码后取长度，与阈值配置使用的“字符数”口径一致
+        （中文等多字节字符不会被按字节数放大）。
+
+        Args:
+            obj: 可 JSON 序列化的对象
+
+        Returns:
+            JSON（默认分隔符、保留非 ASCII 字符）的字符数
+        """
+        separators = _separator_count(obj)
+        if separators is None:
+            return _stdlib_json_chars(obj)
+        try:
+            data = orjson.dumps(obj, option=_ORJSON_OPTS)
+        except orjson.JSONEncodeError:
+            # orjson 不支持的值（如超出 64 位的整数）交给标准库处理
+            return _stdlib_json_chars(obj)
+        size = len(data) if data.isascii() else len(data.decode("utf-8"))
+        return size + separators
+
+else:
+
+    def json_chars(obj: Any) -> int:
+        """计算对象序列化为 JSON 后的字符数（与 json.dumps(obj, ensure_ascii=False) 等长）
+
+        Args:
+            obj: 可 JSON 序列化的对象
+
+        Returns:
+            JSON（默认分隔符、保留非 ASCII 字符）的字符数
+        """
+        return _stdlib_json_chars(obj)
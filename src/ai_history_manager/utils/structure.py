@@ -3,7 +3,15 @@
 提供历史消息结构分析和格式化功能。
 """
 
-from typing import Any
+import io
+import re
+from typing import Any, Optional
+
+# OpenAI/Anthropic 格式 role -> 类型标识
+_ROLE_KIND = {"user": "U", "assistant": "A"}
+
+# 类型序列中相邻两条同类消息的位置（前瞻匹配，重叠的 "UUU" 也逐个命中）
+_CONSECUTIVE_RE = re.compile(r"(?=UU|AA)")
 
 
 def extract_text(content: Any) -> str:
@@ -32,12 +40,16 @@ def extract_text(content: Any) -> str:
                 texts.append(item)
             else:
                 texts.append(extract_text(item))
-        return "\n".join(filter(None, texts))
+        if len(texts) == 1 and isinstance(texts[0], str):
+            return texts[0]
+        # 传入列表：join 可预知长度，比生成器/filter 更快
+        return "\n".join([text for text in texts if text])
 
     if isinstance(content, dict):
         # 优先检查 text 字段
-        if "text" in content and isinstance(content.get("text"), str):
-            return content["text"]
+        text = content.get("text")
+        if isinstance(text, str):
+            return text
         # 其次检查 content 字段
         if "content" in content:
             return extract_text(content["content"])
@@ -45,17 +57,26 @@ def extract_text(content: Any) -> str:
     return str(content) if content else ""
 
 
-def format_history_for_summary(history: list[dict], max_chars_per_message: int = 500) -> str:
+def format_history_for_summary(
+    history: list[dict],
+    max_chars_per_message: int = 500,
+    *,
+    max_chars: Optional[int] = None,
+) -> str:
     """格式化历史消息用于生成摘要
 
     Args:
         history: 历史消息列表
         max_chars_per_message: 每条消息最大字符数
+        max_chars: 输出总字符数上限，超出时截断并追加 "\n...(truncated)"；
+            达到上限后不再格式化剩余消息
 
     Returns:
         格式化后的文本
     """
-    lines = []
+    buf = io.StringIO()
+    sep = ""  # 首行之前不写换行分隔符
+    total = -1  # 已输出字符数（含换行分隔符）
 
     for msg in history:
         role = "unknown"
@@ -70,16 +91,36 @@ def format_history_for_summary(history: list[dict], max_chars_per_message: int =
             content = msg.get("assistantResponseMessage", {}).get("content", "")
         # OpenAI/Anthropic 格式
         else:
-            role = msg.get("role", "unknown")
+            role = str(msg.get("role", "unknown"))
             content = extract_text(msg.get("content", ""))
 
+        # 直接写入缓冲区，不构造行列表和拼接后的单行字符串
+        buf.write(f"{sep}[{role}]: ")
+        sep = "\n"
+        line_len = len(role) + 4
         # 截断过长的单条消息
         if len(content) > max_chars_per_message:
-            content = content[:max_chars_per_message] + "..."
+            buf.write(content[:max_chars_per_message])
+            buf.write("...")
+            line_len += max_chars_per_message + 3
+        else:
+            buf.write(content)
+            line_len += len(content)
+
+        if max_chars is not None:
+            total += line_len + 1
+            if total > max_chars:
+                return buf.getvalue()[:max_chars] + "\n...(truncated)"
+
+    return buf.getvalue()
 
-        lines.append(f"[{role}]: {content}")
 
-    return "\n".join(lines)
+def _role_kind(role: Any) -> str:
+    """OpenAI/Anthropic 格式 role 的类型标识
+
+    role 来自未经校验的请求体，可能是列表、字典等不可哈希的值，非字符串一律视为未知。
+    """
+    return _ROLE_KIND.get(role, "?") if isinstance(role, str) else "?"
 
 
 def _get_entry_kind(msg: dict) -> str:
@@ -98,13 +139,7 @@ def _get_entry_kind(msg: dict) -> str:
         return "A"
 
     # OpenAI/Anthropic 格式
-    role = msg.get("role")
-    if role == "user":
-        return "U"
-    if role == "assistant":
-        return "A"
-
-    return "?"
+    return _role_kind(msg.get("role"))
 
 
 def summarize_history_structure(history: list[dict], max_items: int = 12) -> str:
@@ -120,42 +155,44 @@ def summarize_history_structure(history: list[dict], max_items: int = 12) -> str
     if not history:
         return "len=0"
 
-    kinds = [_get_entry_kind(msg) for msg in history]
-
-    # 统计各类型数量
-    counts = {"U": 0, "A": 0, "?": 0}
-    for k in kinds:
-        counts[k] = counts.get(k, 0) + 1
-
-    # 检查是否交替
-    alternating = True
-    for i in range(1, len(kinds)):
-        if kinds[i] == kinds[i - 1] or kinds[i] == "?" or kinds[i - 1] == "?":
-            alternating = False
-            break
-
-    # 统计工具调用
+    kind_list = []
     tool_uses = 0
     tool_results = 0
 
+    # 单次遍历收集类型标识和工具调用数（内联 _get_entry_kind）
     for msg in history:
+        if "userInputMessage" in msg:
+            kind_list.append("U")
+        elif "assistantResponseMessage" in msg:
+            kind_list.append("A")
+        else:
+            kind_list.append(_role_kind(msg.get("role")))
+
         if "assistantResponseMessage" in msg:
             tool_uses += len(msg["assistantResponseMessage"].get("toolUses", []) or [])
         if "userInputMessage" in msg:
             ctx = msg["userInputMessage"].get("userInputMessageContext", {})
             tool_results += len(ctx.get("toolResults", []) or [])
 
+    # 类型序列拼成字符串后，计数、交替检查和截取都由 str 的 C 实现完成
+    kinds = "".join(kind_list)
+
+    # 交替：没有相邻同类消息，且多于一条时不含未知类型
+    alternating = len(kinds) < 2 or (
+        "?" not in kinds and "UU" not in kinds and "AA" not in kinds
+    )
+
     # 生成序列字符串
     if len(kinds) <= max_items:
-        seq = "".join(kinds)
+        seq = kinds
     else:
         head_len = max_items // 2
         tail_len = max_items - head_len
-        seq = f"{''.join(kinds[:head_len])}...{''.join(kinds[-tail_len:])}"
+        seq = f"{kinds[:head_len]}...{kinds[-tail_len:]}"
 
     return (
         f"len={len(history)} seq={seq} alt={'yes' if alternating else 'no'} "
-        f"U={counts['U']} A={counts['A']} ?={counts['?']} "
+        f"U={kinds.count('U')} A={kinds.count('A')} ?={kinds.count('?')} "
         f"tool_uses={tool_uses} tool_results={tool_results}"
     )
 
@@ -174,12 +211,17 @@ def validate_history_alternation(history: list[dict]) -> tuple[bool, list[str]]:
         (是否有效, 问题列表)
     """
     issues = []
-    kinds = [_get_entry_kind(msg) for msg in history]
+    kinds = "".join([
+        "U" if "userInputMessage" in msg
+        else "A" if "assistantResponseMessage" in msg
+        else _role_kind(msg.get("role"))
+        for msg in history
+    ])
 
     # 检查交替
-    for i in range(1, len(kinds)):
-        if kinds[i] == kinds[i - 1] and kinds[i] != "?":
-            issues.append(f"Position {i}: consecutive {kinds[i]} messages")
+    for match in _CONSECUTIVE_RE.finditer(kinds):
+        i = match.start() + 1
+        issues.append(f"Position {i}: consecutive {kinds[i]} messages")
 
     # 检查 toolUses/toolResults 配对
     pending_tool_uses = set()
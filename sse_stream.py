@@ -0,0 +1,90 @@
+"""SSE 流解析工具
+
+供 test_kiro_response.py / test_thinking.py 等测试脚本共用的字节级 SSE 行解析器。
+"""
+
+import asyncio
+import contextlib
+import re
+from typing import AsyncIterator, Optional, Union
+
+import httpx
+
+# SSE 字段行："<字段>:<可选空白><值>"；行已去除首尾空白
+_SSE_FIELD_RE = re.compile(rb"(data|event|id|retry):[ \t]*(.*)", re.DOTALL)
+
+# 网络读取与解析之间的队列容量（以数据块计），满时读取方等待，形成背压
+_QUEUE_MAXSIZE = 64
+
+
+async def _pump_chunks(
+    response: httpx.Response,
+    queue: "asyncio.Queue[Union[bytes, Exception, None]]",
+) -> None:
+    """后台读取响应数据块放入队列；结束放入 None，出错时放入异常交由消费方抛出"""
+    try:
+        async for chunk in response.aiter_bytes():
+            await queue.put(chunk)
+    except Exception as e:
+        await queue.put(e)
+    else:
+        await queue.put(None)
+
+
+async def iter_sse_fields(
+    response: httpx.Response,
+) -> AsyncIterator[tuple[Optional[bytes], bytes, bytes]]:
+    """逐行解析 SSE 响应
+
+    全程在 bytes 上处理，调用方只在需要打印时解码。每轮用偏移量逐行推进，
+    轮末一次性删除已处理部分；残留的半行不含换行，下一轮从其末尾开始查找，不重复扫描。
+
+    网络读取在后台任务中进行，经有界队列交给这里解析：调用方处理事件（解析/打印）期间，
+    后续数据块仍在被读取，网络 I/O 与处理相互重叠。每轮把队列中已到达的数据块一并取出，
+    零碎的小块合并后只扫描一次。
+
+    Args:
+        response: httpx 流式响应
+
+    Yields:
+        (字段名, 值, 整行)；不符合字段格式的行字段名为 None、值为整行，空行跳过
+    """
+    queue: asyncio.Queue[Union[bytes, Exception, None]] = asyncio.Queue(_QUEUE_MAXSIZE)
+    producer = asyncio.create_task(_pump_chunks(response, queue))
+    buffer = bytearray()
+    scan_from = 0
+    finished = False
+    error: Optional[Exception] = None
+    try:
+        while not finished:
+            chunk = await queue.get()
+            while True:
+                if chunk is None or isinstance(chunk, Exception):
+                    # 先解析完已到达的数据，再抛出读取异常
+                    finished = True
+                    error = chunk
+                    break
+                buffer += chunk
+                if queue.empty():
+                    break
+                chunk = queue.get_nowait()
+            start = 0
+            while (newline := buffer.find(b"\n", scan_from)) != -1:
+                line = bytes(buffer[start:newline]).strip()
+                start = scan_from = newline + 1
+                if not line:
+                    continue
+                match = _SSE_FIELD_RE.match(line)
+                if match:
+                    yield match.group(1), match.group(2), line
+                else:
+                    yield None, line, line
+            del buffer[:start]
+            scan_from = len(buffer)
+        if error is not None:
+            raise error
+    finally:
+        # 调用方提前退出（break/异常）时停止后台读取
+        producer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await producer
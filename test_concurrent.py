@@ -98,5 +98,11 @@ if __name__ == "__main__":
     print("AI History Manager 并发测试")
     print("="*60)
 
+    try:
+        # 可选：安装了 uvloop（>=0.18）时用其事件循环运行
+        from uvloop import run
+    except ImportError:
+        from asyncio import run
+
     # 运行测试 - 10 个并发请求
-    asyncio.run(test_concurrent(10))
+    run(test_concurrent(10))
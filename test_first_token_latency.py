@@ -2,13 +2,30 @@
 """首字延迟测试脚本
 
 测试代理服务器的首字响应时间（TTFT - Time To First Token）
+
+用法:
+    python test_first_token_latency.py                   # 并发 4，各用例并行
+    python test_first_token_latency.py --concurrency 16  # 更高并发，观察排队带来的尾延迟
+    python test_first_token_latency.py --sequential      # 逐次串行，严格测量
+
+安装 uvloop 时自动使用其事件循环，降低客户端侧调度开销对测量的影响；
+安装 h2 (pip install httpx[http2]) 时对 https 目标启用 HTTP/2，多次运行复用同一连接的多路复用流。
 """
 
+import argparse
 import asyncio
+import importlib.util
+import statistics
 import time
 import httpx
 import json
-import sys
+from typing import Optional
+
+try:
+    # 可选：样本较多（--concurrency 较大）时用 numpy 一次性算出全部统计量
+    import numpy as np
+except ImportError:
+    np = None
 
 # 测试配置
 PROXY_URL = "http://localhost:8100/v1/messages"
@@ -18,6 +35,12 @@ DIRECT_URL = "https://api.kiro.ai/v1/messages"  # 直连对比
 import os
 API_KEY = os.environ.get("KIRO_API_KEY", "dba22273-65d3-4dc1-8ce9-182f680b2bf5")
 
+# 每个用例的基础运行次数；并发模式下每个用例运行 NUM_RUNS * 并发数 次
+NUM_RUNS = 3
+
+# h2 为可选依赖：未安装时 httpx 无法启用 HTTP/2，回退到 HTTP/1.1 连接池
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
 # 测试用例
 TEST_CASES = [
     {
@@ -42,40 +65,78 @@ TEST_CASES = [
 ]
 
 
-async def measure_ttft(url: str, request_body: dict, headers: dict) -> tuple[float, str]:
+async def measure_ttft(
+    client: httpx.AsyncClient, url: str, body: bytes, headers: dict
+) -> tuple[float, float, str]:
     """测量首字延迟
 
+    同时给出两种口径：
+    - 总首字延迟：从发起请求开始计时，包含排队、建连/TLS 等客户端侧耗时
+    - 服务端首字延迟：从请求体发送完毕开始计时，只反映服务端处理耗时，
+      不受 DNS/TLS 抖动影响
+
+    Args:
+        client: 复用的 HTTP 客户端（连接池已预热）
+        body: 预先序列化好的 JSON 请求体
+
     Returns:
-        (ttft_ms, first_chunk) - 首字延迟（毫秒）和第一个数据块
+        (ttft_ms, server_ttft_ms, first_chunk) - 总首字延迟、服务端首字延迟（毫秒）和第一个数据块
     """
-    start_time = time.perf_counter()
     first_chunk = ""
-    ttft = 0.0
+    end_ns = 0
+    # httpcore trace 事件名形如 "http11.send_request_body.complete"，去掉协议前缀后记录首次时间戳
+    stamps: dict[str, int] = {}
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        async with client.stream("POST", url, json=request_body, headers=headers) as response:
-            async for chunk in response.aiter_text():
-                if chunk.strip():
-                    ttft = (time.perf_counter() - start_time) * 1000  # 转换为毫秒
-                    first_chunk = chunk[:100]  # 只取前 100 字符
-                    break
+    async def trace(event_name: str, info: dict) -> None:
+        stamps.setdefault(event_name.split(".", 1)[-1], time.perf_counter_ns())
 
-    return ttft, first_chunk
+    start_ns = time.perf_counter_ns()
+    async with client.stream(
+        "POST", url, content=body, headers=headers, extensions={"trace": trace}
+    ) as response:
+        # 按原始字节判断首块，只对命中的首块解码，避免逐块文本解码的开销计入测量
+        async for chunk in response.aiter_bytes():
+            if chunk.strip():
+                end_ns = time.perf_counter_ns()
+                first_chunk = chunk[:100].decode("utf-8", errors="replace")  # 只取前 100 字节
+                break
 
+    if not end_ns:
+        return 0.0, 0.0, first_chunk
 
-async def run_test(test_case: dict, num_runs: int = 3) -> dict:
-    """运行单个测试用例"""
-    print(f"\n{'='*60}")
-    print(f"测试: {test_case['name']}")
-    print(f"消息数: {len(test_case['messages'])}")
-    print(f"{'='*60}")
+    sent_ns = stamps.get("send_request_body.complete", start_ns)
+    return (end_ns - start_ns) / 1e6, (end_ns - sent_ns) / 1e6, first_chunk
 
-    request_body = {
-        "model": test_case["model"],
-        "messages": test_case["messages"],
-        "stream": True,
-        "max_tokens": 100,
-    }
+
+async def warm_up(client: httpx.AsyncClient, url: str) -> None:
+    """预热连接池：先建立好连接，避免第一次计时包含握手开销"""
+    try:
+        await client.options(url)
+    except httpx.HTTPError as e:
+        print(f"⚠️ 预热失败（不影响测试）: {e}")
+
+
+async def run_test(
+    client: httpx.AsyncClient,
+    test_case: dict,
+    num_runs: int = 3,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> dict:
+    """运行单个测试用例
+
+    Args:
+        semaphore: 并发上限；为 None 时逐次串行运行（严格测量，无相互争用）
+    """
+    # 同一用例的多次运行请求体相同，只序列化一次
+    body = json.dumps(
+        {
+            "model": test_case["model"],
+            "messages": test_case["messages"],
+            "stream": True,
+            "max_tokens": 100,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
 
     headers = {
         "Authorization": f"Bearer {API_KEY}",
@@ -86,36 +147,102 @@ async def run_test(test_case: dict, num_runs: int = 3) -> dict:
     results = {
         "name": test_case["name"],
         "proxy_ttft": [],
+        "proxy_server_ttft": [],
         "errors": [],
     }
 
     # 测试代理服务器
+    if semaphore is None:
+        outcomes = []
+        for _ in range(num_runs):
+            try:
+                outcomes.append(await measure_ttft(client, PROXY_URL, body, headers))
+            except Exception as e:
+                outcomes.append(e)
+
+            # 短暂等待避免限流
+            await asyncio.sleep(0.5)
+    else:
+        async def limited_run() -> tuple[float, float, str]:
+            async with semaphore:
+                return await measure_ttft(client, PROXY_URL, body, headers)
+
+        outcomes = await asyncio.gather(
+            *(limited_run() for _ in range(num_runs)), return_exceptions=True
+        )
+
+    # 结果收齐后一次性输出，并行运行时各用例的输出不会交错
+    print(f"\n{'='*60}")
+    print(f"测试: {test_case['name']}")
+    print(f"消息数: {len(test_case['messages'])}")
+    print(f"{'='*60}")
     print(f"\n📡 测试代理服务器 ({PROXY_URL})")
-    for i in range(num_runs):
-        try:
-            ttft, first_chunk = await measure_ttft(PROXY_URL, request_body, headers)
-            results["proxy_ttft"].append(ttft)
-            print(f"  运行 {i+1}: {ttft:.0f}ms")
-            if i == 0:
-                print(f"  首块: {first_chunk[:50]}...")
-        except Exception as e:
-            results["errors"].append(f"代理测试失败: {e}")
-            print(f"  运行 {i+1}: ❌ 错误 - {e}")
-
-        # 短暂等待避免限流
-        await asyncio.sleep(0.5)
-
-    # 计算统计
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            results["errors"].append(f"代理测试失败: {outcome}")
+            print(f"  运行 {i+1}: ❌ 错误 - {outcome}")
+            continue
+        ttft, server_ttft, first_chunk = outcome
+        results["proxy_ttft"].append(ttft)
+        results["proxy_server_ttft"].append(server_ttft)
+        print(f"  运行 {i+1}: {ttft:.0f}ms (服务端 {server_ttft:.0f}ms)")
+        if i == 0:
+            print(f"  首块: {first_chunk[:50]}...")
+
+    # 计算统计（结果中保留一份，汇总时直接复用）
     if results["proxy_ttft"]:
-        avg = sum(results["proxy_ttft"]) / len(results["proxy_ttft"])
-        min_val = min(results["proxy_ttft"])
-        max_val = max(results["proxy_ttft"])
-        print(f"\n📊 代理统计: 平均={avg:.0f}ms, 最小={min_val:.0f}ms, 最大={max_val:.0f}ms")
+        stats = results["stats"] = ttft_stats(results["proxy_ttft"])
+        results["server_avg"] = server_avg = ttft_stats(results["proxy_server_ttft"])["avg"]
+        print(f"\n📊 代理统计: 平均={stats['avg']:.0f}ms, 最小={stats['min']:.0f}ms, 最大={stats['max']:.0f}ms")
+        print(f"   {format_percentiles(stats)}")
+        print(f"   服务端平均={server_avg:.0f}ms（不含建连/发送耗时）")
 
     return results
 
 
-async def main():
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="首字延迟测试 (TTFT)")
+    parser.add_argument(
+        "--concurrency", type=int, default=4,
+        help="同时在途的请求数上限（默认 4），用于测量负载下的排队延迟",
+    )
+    parser.add_argument(
+        "--sequential", action="store_true",
+        help="逐个用例、逐次串行运行（无相互争用的严格测量）",
+    )
+    return parser.parse_args(argv)
+
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def ttft_stats(values: list[float]) -> dict[str, float]:
+    """计算平均/最小/最大及 p50/p90/p95/p99（毫秒）
+
+    安装 numpy 时在连续数组上一次完成；否则用 statistics，二者均为线性插值，结果一致。
+    """
+    if np is not None:
+        arr = np.asarray(values, dtype=np.float64)
+        stats = {"avg": float(arr.mean()), "min": float(arr.min()), "max": float(arr.max())}
+        cuts = np.percentile(arr, PERCENTILES).tolist()
+    else:
+        stats = {"avg": statistics.fmean(values), "min": min(values), "max": max(values)}
+        if len(values) < 2:
+            cuts = [values[0]] * len(PERCENTILES)
+        else:
+            quantiles = statistics.quantiles(values, n=100, method="inclusive")
+            cuts = [quantiles[p - 1] for p in PERCENTILES]
+    stats.update((f"p{p}", cut) for p, cut in zip(PERCENTILES, cuts))
+    return stats
+
+
+def format_percentiles(stats: dict[str, float]) -> str:
+    """格式化分位数输出行"""
+    return ", ".join(f"p{p}={stats[f'p{p}']:.0f}ms" for p in PERCENTILES)
+
+
+async def main(args: argparse.Namespace):
     print("\n" + "="*60)
     print("🚀 首字延迟测试 (TTFT - Time To First Token)")
     print("="*60)
@@ -127,12 +254,32 @@ async def main():
 
     all_results = []
 
-    for test_case in TEST_CASES:
-        try:
-            result = await run_test(test_case, num_runs=3)
-            all_results.append(result)
-        except Exception as e:
-            print(f"\n❌ 测试 '{test_case['name']}' 失败: {e}")
+    # 所有运行共享一个客户端，连接建立只发生在预热阶段，不计入首字延迟
+    async with httpx.AsyncClient(timeout=60.0, http2=HTTP2_AVAILABLE) as client:
+        await warm_up(client, PROXY_URL)
+
+        if args.sequential:
+            # 严格测量：逐个用例、逐次运行
+            outcomes = []
+            for test_case in TEST_CASES:
+                try:
+                    outcomes.append(await run_test(client, test_case, num_runs=NUM_RUNS))
+                except Exception as e:
+                    outcomes.append(e)
+        else:
+            # 默认并行分发各用例，总并发受信号量限制，既模拟负载又避免触发限流
+            semaphore = asyncio.Semaphore(args.concurrency)
+            num_runs = NUM_RUNS * args.concurrency
+            outcomes = await asyncio.gather(
+                *(run_test(client, case, num_runs, semaphore) for case in TEST_CASES),
+                return_exceptions=True,
+            )
+
+        for test_case, outcome in zip(TEST_CASES, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"\n❌ 测试 '{test_case['name']}' 失败: {outcome}")
+            else:
+                all_results.append(outcome)
 
     # 汇总报告
     print("\n" + "="*60)
@@ -142,8 +289,8 @@ async def main():
     for result in all_results:
         name = result["name"]
         if result["proxy_ttft"]:
-            avg = sum(result["proxy_ttft"]) / len(result["proxy_ttft"])
-            print(f"  {name}: {avg:.0f}ms (平均)")
+            stats = result["stats"]
+            print(f"  {name}: {stats['avg']:.0f}ms (平均, 服务端 {result['server_avg']:.0f}ms, p99 {stats['p99']:.0f}ms)")
         else:
             print(f"  {name}: ❌ 无数据")
 
@@ -153,8 +300,10 @@ async def main():
         all_ttft.extend(r["proxy_ttft"])
 
     if all_ttft:
-        overall_avg = sum(all_ttft) / len(all_ttft)
+        overall = ttft_stats(all_ttft)
+        overall_avg = overall["avg"]
         print(f"\n🎯 总体平均首字延迟: {overall_avg:.0f}ms")
+        print(f"   {format_percentiles(overall)}")
 
         if overall_avg < 500:
             print("✅ 优秀 - 首字延迟 < 500ms")
@@ -165,4 +314,10 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        # 可选：安装了 uvloop（>=0.18）时用其事件循环运行
+        from uvloop import run
+    except ImportError:
+        from asyncio import run
+
+    run(main(parse_args()))
@@ -4,12 +4,32 @@
 import httpx
 import json
 import asyncio
+import os
+import sys
+import time
+
+from sse_stream import iter_sse_fields
+
+try:
+    # orjson 直接解析 bytes；orjson.JSONDecodeError 是 json.JSONDecodeError 的子类
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 KIRO_PROXY_BASE = "http://127.0.0.1:8000"
 KIRO_PROXY_URL = f"{KIRO_PROXY_BASE}/kiro/v1/chat/completions"
 KIRO_API_KEY = "dba22273-65d3-4dc1-8ce9-182f680b2bf5"
 
-async def test_stream_response():
+# DEBUG=true 时输出前 10 个事件的完整 JSON；默认只输出字段摘要
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+
+# 可能承载 thinking/reasoning 内容的字段名
+THINKING_FIELDS = frozenset({
+    "reasoning_content", "reasoning", "thinking",
+    "thought", "internal_thoughts", "chain_of_thought",
+})
+
+async def test_stream_response(client: httpx.AsyncClient):
     """测试流式响应，打印所有字段"""
 
     request_body = {
@@ -30,77 +50,75 @@ async def test_stream_response():
     print("Testing Kiro API Stream Response")
     print("=" * 60)
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        async with client.stream(
-            "POST",
-            KIRO_PROXY_URL,
-            json=request_body,
-            headers=headers,
-        ) as response:
-            print(f"Status: {response.status_code}")
-            print(f"Headers: {dict(response.headers)}")
-            print("\n--- Stream Events ---\n")
-
-            buffer = ""
-            event_count = 0
-
-            async for chunk in response.aiter_text():
-                buffer += chunk
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line = line.strip()
-
-                    if not line:
-                        continue
-
-                    if line.startswith("data:"):
-                        data_str = line[5:].strip()
-
-                        if data_str == "[DONE]":
-                            print("\n[DONE]")
-                            continue
-
-                        try:
-                            data = json.loads(data_str)
-                            event_count += 1
-
-                            # 打印完整的 JSON 结构（前 10 个事件）
-                            if event_count <= 10:
-                                print(f"\nEvent #{event_count}:")
-                                print(json.dumps(data, indent=2, ensure_ascii=False))
-                            elif event_count == 11:
-                                print("\n... (showing summary for remaining events) ...")
-
-                            # 检查所有可能包含 thinking/reasoning 的字段
-                            choice = data.get("choices", [{}])[0]
-                            delta = choice.get("delta", {})
-
-                            # 打印 delta 中的所有键
-                            if delta and event_count <= 20:
-                                keys = list(delta.keys())
-                                if keys and keys != ['content'] and keys != ['role']:
-                                    print(f"  Delta keys: {keys}")
-
-                            # 检查特定字段
-                            for field in ['reasoning_content', 'reasoning', 'thinking',
-                                         'thought', 'internal_thoughts', 'chain_of_thought']:
-                                if field in delta:
-                                    print(f"\n*** Found {field} in delta: {delta[field][:100]}...")
-                                if field in choice:
-                                    print(f"\n*** Found {field} in choice: {choice[field][:100]}...")
-                                if field in data:
-                                    print(f"\n*** Found {field} in data: {data[field][:100]}...")
-
-                        except json.JSONDecodeError as e:
-                            print(f"JSON Error: {e}")
-                            print(f"Raw: {data_str[:200]}")
-                    else:
-                        print(f"Non-data line: {line}")
-
-            print(f"\n\nTotal events: {event_count}")
-
-
-async def test_non_stream_response():
+    async with client.stream(
+        "POST",
+        KIRO_PROXY_URL,
+        json=request_body,
+        headers=headers,
+    ) as response:
+        print(f"Status: {response.status_code}")
+        print(f"Headers: {dict(response.headers)}")
+        print("\n--- Stream Events ---\n")
+
+        event_count = 0
+        # 流式循环内不直接 print（终端写入是同步的，会计入测量耗时），结束后一次性输出
+        output: list[str] = []
+        emit = output.append
+        started = time.perf_counter()
+
+        # SSE 行解析见 sse_stream.iter_sse_fields（字节级，只在打印时解码）
+        async for name, value, line in iter_sse_fields(response):
+            if name == b"data":
+                data_str = value
+
+                if data_str == b"[DONE]":
+                    emit("\n[DONE]")
+                    continue
+
+                try:
+                    data = json_loads(data_str)
+                    event_count += 1
+
+                    # 打印完整的 JSON 结构（前 10 个事件）
+                    if DEBUG and event_count <= 10:
+                        emit(f"\nEvent #{event_count}:")
+                        emit(json.dumps(data, indent=2, ensure_ascii=False))
+                    elif DEBUG and event_count == 11:
+                        emit("\n... (showing summary for remaining events) ...")
+
+                    # 检查所有可能包含 thinking/reasoning 的字段
+                    choice = data.get("choices", [{}])[0]
+                    delta = choice.get("delta", {})
+
+                    # 打印 delta 中的所有键
+                    if delta and event_count <= 20:
+                        keys = list(delta.keys())
+                        if keys and keys != ['content'] and keys != ['role']:
+                            emit(f"  Delta keys: {keys}")
+
+                    # 检查特定字段（与键集合求交集，绝大多数事件结果为空）
+                    for field in delta.keys() & THINKING_FIELDS:
+                        emit(f"\n*** Found {field} in delta: {delta[field][:100]}...")
+                    for field in choice.keys() & THINKING_FIELDS:
+                        emit(f"\n*** Found {field} in choice: {choice[field][:100]}...")
+                    for field in data.keys() & THINKING_FIELDS:
+                        emit(f"\n*** Found {field} in data: {data[field][:100]}...")
+
+                except json.JSONDecodeError as e:
+                    emit(f"JSON Error: {e}")
+                    emit(f"Raw: {data_str[:200].decode('utf-8', errors='replace')}")
+            else:
+                emit(f"Non-data line: {line.decode('utf-8', errors='replace')}")
+
+        duration = time.perf_counter() - started
+        output.append("")
+        sys.stdout.write("\n".join(output))
+
+        rate = event_count / duration if duration > 0 else 0.0
+        print(f"\n\nTotal events: {event_count} in {duration:.2f}s ({rate:.1f} events/s)")
+
+
+async def test_non_stream_response(client: httpx.AsyncClient):
     """测试非流式响应，打印完整结构"""
 
     request_body = {
@@ -121,41 +139,50 @@ async def test_non_stream_response():
     print("Testing Kiro API Non-Stream Response")
     print("=" * 60)
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            KIRO_PROXY_URL,
-            json=request_body,
-            headers=headers,
-        )
+    response = await client.post(
+        KIRO_PROXY_URL,
+        json=request_body,
+        headers=headers,
+    )
 
-        print(f"Status: {response.status_code}")
+    print(f"Status: {response.status_code}")
+
+    try:
+        data = response.json()
+        print("\nFull Response Structure:")
+        print(json.dumps(data, indent=2, ensure_ascii=False))
 
-        try:
-            data = response.json()
-            print("\nFull Response Structure:")
-            print(json.dumps(data, indent=2, ensure_ascii=False))
+        # 检查 message 中的所有字段
+        choice = data.get("choices", [{}])[0]
+        message = choice.get("message", {})
 
-            # 检查 message 中的所有字段
-            choice = data.get("choices", [{}])[0]
-            message = choice.get("message", {})
+        print(f"\nMessage keys: {list(message.keys())}")
 
-            print(f"\nMessage keys: {list(message.keys())}")
+        # 检查特定字段
+        for field in message.keys() & THINKING_FIELDS:
+            val = message[field]
+            if isinstance(val, str):
+                print(f"\n*** Found {field}: {val[:200]}...")
+            else:
+                print(f"\n*** Found {field}: {val}")
 
-            # 检查特定字段
-            for field in ['reasoning_content', 'reasoning', 'thinking',
-                         'thought', 'internal_thoughts', 'chain_of_thought']:
-                if field in message:
-                    val = message[field]
-                    if isinstance(val, str):
-                        print(f"\n*** Found {field}: {val[:200]}...")
-                    else:
-                        print(f"\n*** Found {field}: {val}")
+    except Exception as e:
+        print(f"Error: {e}")
+        print(f"Raw: {response.text[:500]}")
 
-        except Exception as e:
-            print(f"Error: {e}")
-            print(f"Raw: {response.text[:500]}")
+
+async def main():
+    """两项测试共享一个客户端，复用已建立的连接"""
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        await test_stream_response(client)
+        await test_non_stream_response(client)
 
 
 if __name__ == "__main__":
-    asyncio.run(test_stream_response())
-    asyncio.run(test_non_stream_response())
+    try:
+        # 可选：安装了 uvloop（>=0.18）时用其事件循环运行
+        from uvloop import run
+    except ImportError:
+        from asyncio import run
+
+    run(main())
@@ -4,11 +4,34 @@
 import httpx
 import json
 import asyncio
+import os
+import sys
+import time
+
+from sse_stream import iter_sse_fields
+
+try:
+    # orjson 直接解析 bytes；orjson.JSONDecodeError 是 json.JSONDecodeError 的子类
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 API_BASE = "http://127.0.0.1:8100"
 API_KEY = "test-key"
 
-async def test_anthropic_thinking_stream():
+# DEBUG=true 时输出每个 thinking 事件的完整 JSON；默认只输出摘要行
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+
+
+def _has_thinking(data: dict) -> bool:
+    """事件是否与 thinking 相关（按字段判断，不把整个事件转成字符串再搜索）"""
+    return (
+        data.get("type", "").endswith("thinking")
+        or data.get("delta", {}).get("type") == "thinking_delta"
+        or data.get("content_block", {}).get("type") == "thinking"
+    )
+
+async def test_anthropic_thinking_stream(client: httpx.AsyncClient):
     """测试 Anthropic API 流式响应的 thinking 功能"""
 
     request_body = {
@@ -34,80 +57,81 @@ async def test_anthropic_thinking_stream():
     print("Testing Anthropic API Stream with Thinking")
     print("=" * 60)
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        async with client.stream(
-            "POST",
-            f"{API_BASE}/v1/messages",
-            json=request_body,
-            headers=headers,
-        ) as response:
-            print(f"Status: {response.status_code}")
-            print("\n--- Stream Events ---\n")
-
-            buffer = ""
-            event_count = 0
-            thinking_found = False
-            text_found = False
-
-            async for chunk in response.aiter_text():
-                buffer += chunk
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line = line.strip()
-
-                    if not line:
-                        continue
-
-                    if line.startswith("data:"):
-                        data_str = line[5:].strip()
-
-                        if data_str == "[DONE]":
-                            print("\n[DONE]")
-                            continue
-
-                        try:
-                            data = json.loads(data_str)
-                            event_count += 1
-                            event_type = data.get("type", "unknown")
-
-                            # 检查 thinking 相关事件
-                            if "thinking" in str(data):
-                                thinking_found = True
-                                print(f"\n🧠 Event #{event_count} ({event_type}):")
-                                print(json.dumps(data, indent=2, ensure_ascii=False)[:500])
-
-                            # 检查 text 相关事件
-                            if event_type == "content_block_start":
-                                block = data.get("content_block", {})
-                                block_type = block.get("type")
-                                print(f"\n📦 Content Block Start: type={block_type}")
-                                if block_type == "thinking":
-                                    thinking_found = True
-                                elif block_type == "text":
-                                    text_found = True
-
-                            if event_type == "content_block_delta":
-                                delta = data.get("delta", {})
-                                delta_type = delta.get("type")
-                                if delta_type == "thinking_delta":
-                                    thinking = delta.get("thinking", "")[:100]
-                                    print(f"  🧠 Thinking: {thinking}...")
-                                elif delta_type == "text_delta":
-                                    text = delta.get("text", "")[:100]
-                                    print(f"  📝 Text: {text}...")
-
-                            if event_type == "message_stop":
-                                print(f"\n✅ Message Stop")
-
-                        except json.JSONDecodeError as e:
-                            print(f"JSON Error: {e}")
-
-            print(f"\n\nTotal events: {event_count}")
-            print(f"Thinking found: {thinking_found}")
-            print(f"Text found: {text_found}")
-
-
-async def test_anthropic_thinking_non_stream():
+    async with client.stream(
+        "POST",
+        f"{API_BASE}/v1/messages",
+        json=request_body,
+        headers=headers,
+    ) as response:
+        print(f"Status: {response.status_code}")
+        print("\n--- Stream Events ---\n")
+
+        event_count = 0
+        thinking_found = False
+        text_found = False
+        # 流式循环内不直接 print（终端写入是同步的，会计入测量耗时），结束后一次性输出
+        output: list[str] = []
+        emit = output.append
+        started = time.perf_counter()
+
+        # SSE 行解析见 sse_stream.iter_sse_fields（字节级，只在打印时解码）
+        async for name, value, line in iter_sse_fields(response):
+            if name == b"data":
+                data_str = value
+
+                if data_str == b"[DONE]":
+                    emit("\n[DONE]")
+                    continue
+
+                try:
+                    data = json_loads(data_str)
+                    event_count += 1
+                    event_type = data.get("type", "unknown")
+
+                    # 检查 thinking 相关事件
+                    if _has_thinking(data):
+                        thinking_found = True
+                        if DEBUG:
+                            emit(f"\n🧠 Event #{event_count} ({event_type}):")
+                            emit(json.dumps(data, indent=2, ensure_ascii=False)[:500])
+
+                    # 检查 text 相关事件
+                    if event_type == "content_block_start":
+                        block = data.get("content_block", {})
+                        block_type = block.get("type")
+                        emit(f"\n📦 Content Block Start: type={block_type}")
+                        if block_type == "thinking":
+                            thinking_found = True
+                        elif block_type == "text":
+                            text_found = True
+
+                    if event_type == "content_block_delta":
+                        delta = data.get("delta", {})
+                        delta_type = delta.get("type")
+                        if delta_type == "thinking_delta":
+                            thinking = delta.get("thinking", "")[:100]
+                            emit(f"  🧠 Thinking: {thinking}...")
+                        elif delta_type == "text_delta":
+                            text = delta.get("text", "")[:100]
+                            emit(f"  📝 Text: {text}...")
+
+                    if event_type == "message_stop":
+                        emit(f"\n✅ Message Stop")
+
+                except json.JSONDecodeError as e:
+                    emit(f"JSON Error: {e}")
+
+        duration = time.perf_counter() - started
+        output.append("")
+        sys.stdout.write("\n".join(output))
+
+        rate = event_count / duration if duration > 0 else 0.0
+        print(f"\n\nTotal events: {event_count} in {duration:.2f}s ({rate:.1f} events/s)")
+        print(f"Thinking found: {thinking_found}")
+        print(f"Text found: {text_found}")
+
+
+async def test_anthropic_thinking_non_stream(client: httpx.AsyncClient):
     """测试 Anthropic API 非流式响应的 thinking 功能"""
 
     request_body = {
@@ -133,39 +157,50 @@ async def test_anthropic_thinking_non_stream():
     print("Testing Anthropic API Non-Stream with Thinking")
     print("=" * 60)
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(
-            f"{API_BASE}/v1/messages",
-            json=request_body,
-            headers=headers,
-        )
+    response = await client.post(
+        f"{API_BASE}/v1/messages",
+        json=request_body,
+        headers=headers,
+    )
 
-        print(f"Status: {response.status_code}")
+    print(f"Status: {response.status_code}")
+
+    try:
+        data = response.json()
+        print("\nResponse:")
+        print(json.dumps(data, indent=2, ensure_ascii=False)[:2000])
 
-        try:
-            data = response.json()
-            print("\nResponse:")
-            print(json.dumps(data, indent=2, ensure_ascii=False)[:2000])
+        # 检查 content blocks
+        content = data.get("content", [])
+        print(f"\nContent blocks: {len(content)}")
 
-            # 检查 content blocks
-            content = data.get("content", [])
-            print(f"\nContent blocks: {len(content)}")
+        for i, block in enumerate(content):
+            block_type = block.get("type")
+            print(f"  Block {i}: type={block_type}")
+            if block_type == "thinking":
+                thinking = block.get("thinking", "")[:200]
+                print(f"    🧠 Thinking: {thinking}...")
+            elif block_type == "text":
+                text = block.get("text", "")[:200]
+                print(f"    📝 Text: {text}...")
 
-            for i, block in enumerate(content):
-                block_type = block.get("type")
-                print(f"  Block {i}: type={block_type}")
-                if block_type == "thinking":
-                    thinking = block.get("thinking", "")[:200]
-                    print(f"    🧠 Thinking: {thinking}...")
-                elif block_type == "text":
-                    text = block.get("text", "")[:200]
-                    print(f"    📝 Text: {text}...")
+    except Exception as e:
+        print(f"Error: {e}")
+        print(f"Raw: {response.text[:500]}")
 
-        except Exception as e:
-            print(f"Error: {e}")
-            print(f"Raw: {response.text[:500]}")
+
+async def main():
+    """两项测试共享一个客户端，复用已建立的连接"""
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        await test_anthropic_thinking_stream(client)
+        await test_anthropic_thinking_non_stream(client)
 
 
 if __name__ == "__main__":
-    asyncio.run(test_anthropic_thinking_stream())
-    asyncio.run(test_anthropic_thinking_non_stream())
+    try:
+        # 可选：安装了 uvloop（>=0.18）时用其事件循环运行
+        from uvloop import run
+    except ImportError:
+        from asyncio import run
+
+    run(main())
@@ -74,7 +74,9 @@ def test_parse(name, text):
             print(f"  [{i}] tool_use: {block['name']}")
             print(f"       input: {json.dumps(block['input'], ensure_ascii=False)[:100]}")
         else:
-            print(f"  [{i}] text: {block['text'][:50]}..." if len(block.get('text', '')) > 50 else f"  [{i}] text: {block.get('text', '')}")
+            txt = block.get('text', '')
+            snippet = f"{txt[:50]}..." if len(txt) > 50 else txt
+            print(f"  [{i}] text: {snippet}")
 
     # 测试 parse_inline_tool_blocks（应该自动检测格式）
     inline_blocks = parse_inline_tool_blocks(text)
@@ -84,7 +86,9 @@ def test_parse(name, text):
             print(f"  [{i}] tool_use: {block['name']}")
             print(f"       input: {json.dumps(block['input'], ensure_ascii=False)[:100]}")
         else:
-            print(f"  [{i}] text: {block['text'][:50]}..." if len(block.get('text', '')) > 50 else f"  [{i}] text: {block.get('text', '')}")
+            txt = block.get('text', '')
+            snippet = f"{txt[:50]}..." if len(txt) > 50 else txt
+            print(f"  [{i}] text: {snippet}")
 
 if __name__ == '__main__':
     test_parse("Simple XML tool call", test1)
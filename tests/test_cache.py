@@ -56,7 +56,7 @@ class TestSummaryCache:
         )
 
         # 修改时间戳使其过期
-        cache._entries["test_key"].updated_at = time.time() - 200
+        cache._entries["test_key"].updated_at = time.monotonic() - 200
 
         result = cache.get(
             key="test_key",
@@ -128,6 +128,21 @@ class TestSummaryCache:
         assert cache.get("key2", 2, 200, 0, 0, 0) == "summary2"
         assert cache.get("key3", 3, 300, 0, 0, 0) == "summary3"
 
+    def test_eviction_prefers_least_accessed(self):
+        """测试淘汰访问次数最少的条目"""
+        cache = SummaryCache(max_entries=2)
+
+        cache.set("key1", "summary1", 1, 100)
+        cache.set("key2", "summary2", 2, 200)
+        assert cache.get("key1", 1, 100, 3, 4000, 0) == "summary1"
+
+        cache.set("key3", "summary3", 3, 300)  # key2 未被访问，应该被淘汰
+
+        assert cache.size() == 2
+        assert cache.get("key2", 2, 200, 3, 4000, 0) is None
+        assert cache.get("key1", 1, 100, 3, 4000, 0) == "summary1"
+        assert cache.get("key3", 3, 300, 3, 4000, 0) == "summary3"
+
     def test_invalidate(self):
         """测试手动失效"""
         cache = SummaryCache()
@@ -147,16 +162,99 @@ class TestSummaryCache:
         assert count == 2
         assert cache.size() == 0
 
-    def test_cleanup_expired(self):
+    def test_cleanup_expired(self, monkeypatch):
         """测试清理过期缓存"""
+        from ai_history_manager.cache import memory
+
+        clock = [1000.0]
+        monkeypatch.setattr(memory, "_now", lambda: clock[0])
         cache = SummaryCache()
 
         cache.set("key1", "summary1", 1, 100)
+        clock[0] += 100
         cache.set("key2", "summary2", 2, 200)
 
-        # 修改 key1 的时间戳使其过期
-        cache._entries["key1"].updated_at = time.time() - 200
-
+        # key1 已存在 200 秒，key2 100 秒
+        clock[0] += 100
         count = cache.cleanup_expired(max_age_seconds=180)
         assert count == 1
         assert cache.size() == 1
+        assert cache.get("key2", 2, 200, 3, 4000, 0) == "summary2"
+
+    def test_cleanup_expired_skips_refreshed_entries(self, monkeypatch):
+        """测试覆盖写入后，旧时间戳的索引项不会删除刷新过的条目"""
+        from ai_history_manager.cache import memory
+
+        clock = [1000.0]
+        monkeypatch.setattr(memory, "_now", lambda: clock[0])
+        cache = SummaryCache()
+
+        cache.set("key1", "old", 1, 100)
+        clock[0] += 150
+        cache.set("key1", "new", 2, 200)
+        cache.set("key2", "summary2", 2, 200)
+        cache.invalidate("key2")
+
+        clock[0] += 100
+        assert cache.cleanup_expired(max_age_seconds=180) == 0
+        assert cache.get("key1", 2, 200, 3, 4000, 0) == "new"
+
+        clock[0] += 100
+        assert cache.cleanup_expired(max_age_seconds=180) == 1
+        assert cache.size() == 0
+
+    def test_bulk_eviction_after_shrink(self):
+        """测试容量调小后一次性淘汰多余条目"""
+        cache = SummaryCache(max_entries=5)
+
+        for i in range(5):
+            cache.set(f"key{i}", f"summary{i}", i, i * 100)
+        assert cache.get("key3", 3, 300, 3, 4000, 0) == "summary3"
+
+        cache._max_entries = 2
+        cache.set("key5", "summary5", 5, 500)
+
+        assert cache.size() == 2
+        assert cache.get("key3", 3, 300, 3, 4000, 0) == "summary3"
+        assert cache.get("key5", 5, 500, 3, 4000, 0) == "summary5"
+
+    def test_concurrent_access(self):
+        """测试多线程并发读写不会破坏缓存"""
+        import threading
+
+        cache = SummaryCache(max_entries=16)
+        errors = []
+
+        def worker(worker_id: int):
+            try:
+                for i in range(500):
+                    key = f"key{(worker_id * 7 + i) % 40}"
+                    cache.set(key, f"summary{i}", i, i)
+                    cache.get(key, i, i, 3, 4000, 180)
+                    if i % 50 == 0:
+                        cache.cleanup_expired(max_age_seconds=180)
+            except Exception as e:  # pragma: no cover - 失败时收集异常
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        assert cache.size() <= 16
+
+    def test_get_with_stale(self):
+        """测试过期条目以 stale 标记返回且不被删除"""
+        cache = SummaryCache()
+        cache.set("test_key", "test summary", 5, 1000)
+
+        assert cache.get_with_stale("test_key", 5, 1000, 3, 4000, 180) == ("test summary", False)
+
+        cache._entries["test_key"].updated_at = time.monotonic() - 200
+        assert cache.get_with_stale("test_key", 5, 1000, 3, 4000, 180) == ("test summary", True)
+        assert cache.size() == 1
+
+        # 历史变化量超限仍视为未命中
+        assert cache.get_with_stale("test_key", 10, 1000, 3, 4000, 180) == (None, False)
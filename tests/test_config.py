@@ -1,18 +1,29 @@
 """配置测试"""
+import dataclasses
 import pytest
 import tempfile
 import os
 from pathlib import Path
 
 from ai_history_manager import HistoryConfig, TruncateStrategy, load_config, load_config_from_file
+from ai_history_manager.config.config import (
+    clear_default_config_path_cache,
+    get_default_config_path,
+)
+
+
+@pytest.fixture(scope="module")
+def default_config():
+    """默认配置（HistoryConfig 不可变，模块内各测试共享同一实例）"""
+    return HistoryConfig()
 
 
 class TestHistoryConfig:
     """HistoryConfig 测试"""
 
-    def test_default_values(self):
+    def test_default_values(self, default_config):
         """测试默认值"""
-        config = HistoryConfig()
+        config = default_config
 
         assert config.max_messages == 30
         assert config.max_chars == 150000
@@ -23,8 +34,16 @@ class TestHistoryConfig:
         assert config.estimate_threshold == 180000
         assert config.chars_per_token == 3.0
         assert config.summary_cache_enabled is True
+        assert config.summary_cache_serve_stale is False
         assert config.add_warning_header is True
 
+    def test_serve_stale_opt_in(self):
+        """测试过期摘要复用需显式开启"""
+        assert HistoryConfig.from_dict({}).summary_cache_serve_stale is False
+        assert load_config({"history_manager": {}}).summary_cache_serve_stale is False
+        config = load_config({"history_manager": {"cache": {"serve_stale": True}}})
+        assert config.summary_cache_serve_stale is True
+
     def test_to_dict(self):
         """测试转换为字典"""
         config = HistoryConfig(
@@ -37,6 +56,17 @@ class TestHistoryConfig:
         assert "smart_summary" in data["strategies"]
         assert data["max_messages"] == 20
 
+    def test_frozen(self, default_config):
+        """测试配置不可变，通过 replace 派生新配置"""
+        config = default_config
+
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            config.max_messages = 10
+
+        derived = dataclasses.replace(config, max_messages=10)
+        assert derived.max_messages == 10
+        assert config.max_messages == 30
+
     def test_from_dict(self):
         """测试从字典创建"""
         data = {
@@ -61,10 +91,9 @@ class TestHistoryConfig:
         assert TruncateStrategy.ERROR_RETRY in config.strategies
         assert len(config.strategies) == 1
 
-    def test_validate_success(self):
+    def test_validate_success(self, default_config):
         """测试验证通过"""
-        config = HistoryConfig()
-        errors = config.validate()
+        errors = default_config.validate()
         assert len(errors) == 0
 
     def test_validate_errors(self):
@@ -167,12 +196,57 @@ history_manager:
             finally:
                 os.unlink(f.name)
 
+    def test_load_from_file_cached_copy(self, tmp_path):
+        """测试文件未修改时复用解析结果，且返回独立副本"""
+        config_file = tmp_path / "history.yaml"
+        config_file.write_text("history_manager:\n  limits:\n    max_messages: 12\n")
+
+        first = load_config_from_file(config_file)
+        first.strategies.append(TruncateStrategy.SMART_SUMMARY)
+
+        second = load_config_from_file(config_file)
+        assert second is not first
+        assert second.max_messages == 12
+        assert second.strategies == [TruncateStrategy.ERROR_RETRY]
+
+        stat = config_file.stat()
+        config_file.write_text("history_manager:\n  limits:\n    max_messages: 15\n")
+        os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert load_config_from_file(config_file).max_messages == 15
+
     def test_load_from_nonexistent_file(self):
         """测试加载不存在的文件"""
         with pytest.raises(FileNotFoundError):
             load_config_from_file("/nonexistent/path/config.yaml")
 
 
+class TestDefaultConfigPath:
+    """get_default_config_path 测试"""
+
+    def test_env_path_and_cache(self, tmp_path, monkeypatch):
+        """测试环境变量优先，且结果按环境变量缓存"""
+        config_file = tmp_path / "custom.yaml"
+        config_file.write_text("history_manager: {}\n")
+        monkeypatch.setenv("AI_HISTORY_MANAGER_CONFIG", str(config_file))
+        clear_default_config_path_cache()
+
+        assert get_default_config_path() == config_file
+
+        config_file.unlink()
+        assert get_default_config_path() == config_file  # 命中缓存
+
+        clear_default_config_path_cache()
+        assert get_default_config_path() != config_file
+
+    def test_cwd_config(self, tmp_path, monkeypatch):
+        """测试当前目录下的配置文件"""
+        (tmp_path / "history.yaml").write_text("history_manager: {}\n")
+        monkeypatch.delenv("AI_HISTORY_MANAGER_CONFIG", raising=False)
+        monkeypatch.chdir(tmp_path)
+
+        assert get_default_config_path() == tmp_path / "history.yaml"
+
+
 class TestTruncateStrategy:
     """TruncateStrategy 测试"""
 
@@ -0,0 +1,27 @@
+"""格式转换测试"""
+import json
+
+import pytest
+
+from app.services.converter import _json_loads
+
+
+class TestJsonLoads:
+    """JSON 解析测试"""
+
+    def test_matches_stdlib(self):
+        """测试普通输入与标准库解析结果一致"""
+        text = '{"file_path": "/tmp/a", "limit": 10, "flags": [true, null, 1.5]}'
+        assert _json_loads(text) == json.loads(text)
+
+    def test_big_int_keeps_precision(self):
+        """测试超出 64 位的整数不会被转成浮点数"""
+        for value in (12345678901234567890123, -9223372036854775809, 18446744073709551616):
+            parsed = _json_loads(f'{{"id": {value}}}')
+            assert parsed["id"] == value
+            assert isinstance(parsed["id"], int)
+
+    def test_invalid_json_raises(self):
+        """测试非法 JSON 抛出标准库的异常类型"""
+        with pytest.raises(json.JSONDecodeError):
+            _json_loads('{"id": ')
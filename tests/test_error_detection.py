@@ -0,0 +1,46 @@
+"""错误检测测试"""
+from ai_history_manager.utils import ErrorType, is_content_length_error
+from ai_history_manager.utils.error_detection import classify_error
+
+
+class TestContentLengthError:
+    """长度超限错误检测测试"""
+
+    def test_provider_errors(self):
+        """各 API 的长度超限错误"""
+        assert is_content_length_error(400, '{"reason": "CONTENT_LENGTH_EXCEEDS_THRESHOLD"}')
+        assert is_content_length_error(400, '{"code": "context_length_exceeded"}')
+        assert is_content_length_error(400, "Input is too long for requested model.")
+        assert is_content_length_error(400, "This model's Maximum Context Length is 8192")
+
+    def test_keyword_combinations(self):
+        """关键词组合不区分大小写、不要求相邻"""
+        assert is_content_length_error(400, "MESSAGE rejected: body TOO LONG")
+        assert is_content_length_error(400, "Token count exceeds the allowed limit")
+        assert is_content_length_error(400, "inputoken limit")
+
+    def test_unrelated_errors(self):
+        """无关错误不应被识别为长度超限"""
+        assert not is_content_length_error(400, "")
+        assert not is_content_length_error(400, "too long")
+        assert not is_content_length_error(401, "invalid token")
+        assert not is_content_length_error(429, "rate limit reached")
+
+    def test_repeated_text_cached(self):
+        """重复的错误文本命中缓存，过长文本不进入缓存"""
+        from ai_history_manager.utils import error_detection
+
+        cached = error_detection._scan_length_error_cached
+        cached.cache_clear()
+        assert is_content_length_error(400, "Input is too long")
+        assert is_content_length_error(400, "Input is too long")
+        assert cached.cache_info().hits == 1
+
+        long_text = "x" * (error_detection._CACHE_MAX_TEXT + 1) + " token limit"
+        assert is_content_length_error(400, long_text)
+        assert cached.cache_info().currsize == 1
+
+    def test_classify(self):
+        """错误分类"""
+        assert classify_error(400, "Input is too long") == ErrorType.CONTENT_TOO_LONG
+        assert classify_error(429, "slow down") == ErrorType.RATE_LIMITED
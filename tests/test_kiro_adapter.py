@@ -0,0 +1,113 @@
+"""Kiro 适配器测试"""
+import json
+
+import pytest
+
+from ai_history_manager.adapters import KiroEventStreamParser, KiroSummaryAdapter
+
+
+def build_frame(payload: dict, headers: bytes = b"\x01h") -> bytes:
+    """构造一个 event-stream 帧"""
+    body = json.dumps(payload).encode("utf-8")
+    total_len = 12 + len(headers) + len(body) + 4
+    return (
+        total_len.to_bytes(4, "big")
+        + len(headers).to_bytes(4, "big")
+        + b"\x00" * 4
+        + headers
+        + body
+        + b"\x00" * 4
+    )
+
+
+@pytest.fixture
+def stream_bytes():
+    return (
+        build_frame({"assistantResponseEvent": {"content": "你好"}})
+        + build_frame({"content": ", world"})
+        + build_frame({"metadata": {"id": 1}})
+    )
+
+
+class TestKiroEventStreamParser:
+    """event-stream 解析测试"""
+
+    def test_parse_whole_body(self, stream_bytes):
+        """测试一次性解析完整响应"""
+        parser = KiroEventStreamParser()
+        assert parser.feed(stream_bytes) == ["你好", ", world"]
+
+    @pytest.mark.parametrize("chunk_size", [1, 5, 13, 64])
+    def test_parse_chunked(self, stream_bytes, chunk_size):
+        """测试分块喂入时帧跨块拼接"""
+        parser = KiroEventStreamParser()
+        parts = []
+        for i in range(0, len(stream_bytes), chunk_size):
+            parts.extend(parser.feed(stream_bytes[i : i + chunk_size]))
+        assert parts == ["你好", ", world"]
+
+    def test_incomplete_frame_waits(self, stream_bytes):
+        """测试不完整的帧不会提前输出"""
+        first = build_frame({"content": "abc"})
+        parser = KiroEventStreamParser()
+        assert parser.feed(first[:-1]) == []
+        assert parser.feed(first[-1:]) == ["abc"]
+
+    def test_zero_length_frame_stops(self):
+        """测试非法帧长度后停止解析"""
+        parser = KiroEventStreamParser()
+        assert parser.feed(b"\x00" * 16) == []
+        assert parser.feed(build_frame({"content": "abc"})) == []
+
+    def test_invalid_payload_skipped(self):
+        """测试无法解码的帧被跳过而不中断解析"""
+        bad = build_frame({"content": "x"}).replace(b'"x"', b'"\xff"')
+        parser = KiroEventStreamParser()
+        assert parser.feed(bad + build_frame({"content": "ok"})) == ["ok"]
+
+    def test_adapter_parse_event_stream(self, stream_bytes):
+        """测试适配器的整体解析入口"""
+        adapter = KiroSummaryAdapter(api_url="http://localhost", token="t")
+        assert adapter._parse_event_stream(stream_bytes) == "你好, world"
+        assert adapter._parse_event_stream(b"") == ""
+
+
+class TestKiroSummaryAdapter:
+    """适配器请求构建测试"""
+
+    def test_headers_cached_until_credentials_change(self):
+        """测试请求头缓存在凭证更新或属性赋值后失效"""
+        adapter = KiroSummaryAdapter(api_url="http://localhost", token="t1")
+        headers = adapter._build_headers()
+        assert adapter._build_headers() is headers
+        assert headers["Authorization"] == "Bearer t1"
+
+        adapter.update_token("t2")
+        assert adapter._build_headers()["Authorization"] == "Bearer t2"
+
+        adapter.update_credentials(machine_id="m1")
+        assert adapter._build_headers()["x-amzn-machine-id"] == "m1"
+
+        adapter.token = "t3"
+        adapter.profile_arn = "arn"
+        headers = adapter._build_headers()
+        assert headers["Authorization"] == "Bearer t3"
+        assert headers["x-amzn-profile-arn"] == "arn"
+
+    def test_build_request_body(self):
+        """测试预序列化的请求体与完整序列化结果一致"""
+        adapter = KiroSummaryAdapter(api_url="http://localhost", token="t", model="m1")
+        prompt = '总结 "对话"\n\\ end'
+        body = json.loads(adapter._build_request(prompt))
+        message = body["conversationState"]["currentMessage"]["userInputMessage"]
+        assert message == {"content": prompt, "modelId": "m1", "origin": "AI_EDITOR"}
+        assert body["conversationState"]["history"] == []
+
+        adapter.model = "m2"
+        body = json.loads(adapter._build_request("x"))
+        assert body["conversationState"]["currentMessage"]["userInputMessage"]["modelId"] == "m2"
+
+    async def test_generate_summary_encode_failure(self):
+        """测试请求体编码失败时返回空串而不是抛出异常"""
+        adapter = KiroSummaryAdapter(api_url="http://localhost", token="t")
+        assert await adapter.generate_summary("bad \ud800 prompt") == ""
@@ -1,7 +1,10 @@
 """HistoryManager 测试"""
+import asyncio
 import json
 import pytest
 from ai_history_manager import HistoryManager, HistoryConfig, TruncateStrategy
+from ai_history_manager.manager import get_summary_cache
+from ai_history_manager.utils import json_chars
 
 
 class TestHistoryManagerBasic:
@@ -151,6 +154,34 @@ class TestEstimation:
         assert count == 2
         assert chars > 0
 
+    def test_size_matches_json_dumps(self):
+        """测试嵌套内容的字符数与 json.dumps(默认分隔符) 的长度一致（阈值口径）"""
+        manager = HistoryManager()
+        history = [
+            {"role": "user", "content": "你好, world: {x}"},
+            {"role": "assistant", "content": [
+                {"type": "text", "text": "a, b: c"},
+                {"type": "tool_use", "id": "t1", "name": "Read",
+                 "input": {"path": "/tmp/a", "lines": [1, 2, 3], "opts": {}}},
+            ]},
+            {"role": "user", "content": [], "meta": {"n": 1.5, "ok": True, "none": None}},
+        ]
+
+        for size in (0, 1, 3):
+            _, chars = manager.estimate_history_size(history[:size])
+            assert chars == len(json.dumps(history[:size], ensure_ascii=False))
+
+        truncated = manager.truncate_by_chars(history, 60)
+        _, result_chars = manager._truncate_by_chars_sz(history, 60)
+        assert result_chars == len(json.dumps(truncated, ensure_ascii=False))
+
+    def test_float_size_matches_json_dumps(self):
+        """测试指数形式与非有限浮点数的字符数与 json.dumps 一致"""
+        values = [1e16, 1e-7, 1e22, -2.5e-5, float("nan"), float("inf"), -float("inf"), 0.0, 0.5]
+        for value in values:
+            for obj in (value, {"a": value}, [{"meta": {"x": [1, value]}}]):
+                assert json_chars(obj) == len(json.dumps(obj, ensure_ascii=False))
+
     def test_estimate_request_chars(self):
         """测试请求字符数估算"""
         manager = HistoryManager()
@@ -162,6 +193,37 @@ class TestEstimation:
         assert user_chars == len(user_content)
         assert total == history_chars + user_chars
 
+    def test_history_size_cached(self):
+        """测试尺寸缓存只在一次调用内有效，调用之间原地修改消息后重新计算"""
+        manager = HistoryManager()
+        history = [{"role": "user", "content": "你好"}]
+
+        _, first = manager.estimate_history_size(history)
+        assert first == len(json.dumps(history, ensure_ascii=False))
+        assert manager._size_cache == {}
+
+        history[0]["content"] = "你好，请帮我看一下这段代码"
+        _, second = manager.estimate_history_size(history)
+        assert second == len(json.dumps(history, ensure_ascii=False))
+
+        history.append({"role": "assistant", "content": "hello"})
+        assert manager.estimate_request_chars(history)[0] == len(
+            json.dumps(history, ensure_ascii=False)
+        )
+        assert manager._size_cache == {}
+        assert manager._msg_size_cache == {}
+
+    def test_history_size_matches_full_serialization(self):
+        """测试逐条累加的尺寸与整体序列化结果一致"""
+        manager = HistoryManager()
+        history = [
+            {"role": "user", "content": f"问题 {i}", "meta": {"n": i}} for i in range(5)
+        ]
+
+        for part in (history, history[:2], history[2:], []):
+            expected = len(json.dumps(part, ensure_ascii=False))
+            assert manager._history_chars(part) == expected
+
 
 class TestShouldMethods:
     """判断方法测试"""
@@ -251,6 +313,236 @@ class TestHandleLengthError:
         assert not should_retry
 
 
+class TestKiroSummaryHistory:
+    """Kiro 格式摘要历史构建测试"""
+
+    def test_tool_results_filtered(self):
+        """测试清理首条 user 的 toolResults 并过滤孤立的 toolResults"""
+        manager = HistoryManager()
+        recent = [
+            {"assistantResponseMessage": {"content": "skip"}},
+            {
+                "userInputMessage": {
+                    "content": "first",
+                    "userInputMessageContext": {"toolResults": [{"toolUseId": "old"}]},
+                }
+            },
+            {
+                "assistantResponseMessage": {
+                    "content": "call",
+                    "toolUses": [{"toolUseId": "t1"}],
+                }
+            },
+            {
+                "userInputMessage": {
+                    "content": "result",
+                    "modelId": "m1",
+                    "userInputMessageContext": {
+                        "toolResults": [{"toolUseId": "t1"}, {"toolUseId": "orphan"}]
+                    },
+                }
+            },
+        ]
+
+        result = manager._build_summary_history("summary", recent)
+
+        assert len(result) == 5
+        assert "summary" in result[0]["userInputMessage"]["content"]
+        assert result[0]["userInputMessage"]["modelId"] == "m1"
+        assert "userInputMessageContext" not in result[2]["userInputMessage"]
+        assert result[4]["userInputMessage"]["userInputMessageContext"] == {
+            "toolResults": [{"toolUseId": "t1"}]
+        }
+
+    def test_no_tool_uses_clears_context(self):
+        """测试没有 toolUses 时清除所有 user 消息上下文"""
+        manager = HistoryManager()
+        recent = [
+            {"userInputMessage": {"content": "a"}},
+            {"assistantResponseMessage": {"content": "b"}},
+            {
+                "userInputMessage": {
+                    "content": "c",
+                    "userInputMessageContext": {"toolResults": [{"toolUseId": "x"}]},
+                }
+            },
+        ]
+
+        result = manager._build_summary_history("summary", recent)
+
+        assert "userInputMessageContext" not in result[4]["userInputMessage"]
+
+
+class TestAsyncSizing:
+    """异步流程尺寸度量测试"""
+
+    async def test_pre_process_async_measures_off_loop(self, monkeypatch):
+        """测试大历史在线程池中预先度量，每条消息只序列化一次，调用结束后释放缓存"""
+        import ai_history_manager.manager as manager_module
+
+        calls = []
+
+        def counting_json_chars(obj):
+            calls.append(obj)
+            return json_chars(obj)
+
+        monkeypatch.setattr(manager_module, "json_chars", counting_json_chars)
+        config = HistoryConfig(
+            strategies=[TruncateStrategy.AUTO_TRUNCATE, TruncateStrategy.PRE_ESTIMATE],
+            max_messages=100,
+        )
+        manager = HistoryManager(config)
+        history = [{"role": "user", "content": f"message {i}"} for i in range(40)]
+
+        result = await manager.pre_process_async(history, "")
+
+        assert result == history
+        assert len(calls) == len(history)
+        assert manager._msg_size_cache == {}
+        assert manager._measure_depth == 0
+
+
+class TestStaleSummary:
+    """过期摘要后台刷新测试"""
+
+    @staticmethod
+    def _stale_setup(cache_key_prefix: str):
+        """构造一条已过期的摘要缓存"""
+        cache = get_summary_cache()
+        cache.clear()
+        config = HistoryConfig(
+            strategies=[TruncateStrategy.ERROR_RETRY],
+            retry_max_messages=5,
+            summary_cache_serve_stale=True,
+        )
+        manager = HistoryManager(config, cache_key=cache_key_prefix)
+        history = [{"role": "user", "content": f"message {i}"} for i in range(10)]
+
+        old_history = history[:-5]
+        cache_key = manager._summary_cache_key(5)
+        cache.set(cache_key, "old summary", len(old_history), manager._history_chars(old_history))
+        cache._entries[cache_key].updated_at -= 1000
+        return cache, manager, history, cache_key
+
+    async def test_stale_summary_served_and_refreshed(self):
+        """测试过期摘要被直接使用，并在后台刷新"""
+        cache, manager, history, cache_key = self._stale_setup("stale-session")
+        calls = []
+
+        async def generator(prompt):
+            calls.append(prompt)
+            return "new summary"
+
+        result, should_retry = await manager.handle_length_error_async(history, 0, generator)
+
+        assert should_retry
+        assert "old summary" in result[0]["content"]
+        await asyncio.gather(*manager._background_tasks)
+        assert len(calls) == 1
+        assert cache._entries[cache_key].summary == "new summary"
+        assert not manager._refreshing_keys
+        cache.clear()
+
+    def test_stale_summary_refreshed_without_loop(self):
+        """测试没有运行中的事件循环时同步刷新并返回新摘要"""
+        cache, manager, history, cache_key = self._stale_setup("stale-sync-session")
+        old_history = history[:-5]
+
+        async def generator(prompt):
+            return "new summary"
+
+        summary = manager._get_cached_summary(
+            cache_key, old_history, len(old_history), manager._history_chars(old_history), generator
+        )
+
+        assert summary == "new summary"
+        assert cache._entries[cache_key].summary == "new summary"
+        cache.clear()
+
+
+class TestSummaryBatching:
+    """批量摘要测试"""
+
+    async def test_batch_generator_coalesces_prompts(self):
+        """测试声明 __batch__ 的生成函数收到合并后的提示词"""
+        calls = []
+
+        async def batch_generator(prompts):
+            calls.append(len(prompts))
+            return [f"summary {i}" for i in range(len(prompts))]
+
+        batch_generator.__batch__ = True
+
+        manager = HistoryManager()
+        histories = [[{"role": "user", "content": f"message {i}"}] for i in range(3)]
+        results = await asyncio.gather(
+            *(manager.generate_summary(h, batch_generator) for h in histories)
+        )
+
+        assert calls == [3]
+        assert results == ["summary 0", "summary 1", "summary 2"]
+
+    async def test_batch_generator_failure(self):
+        """测试批量生成失败时每个请求都返回 None"""
+
+        async def batch_generator(prompts):
+            return ["only one"]
+
+        batch_generator.__batch__ = True
+
+        manager = HistoryManager()
+        histories = [[{"role": "user", "content": f"message {i}"}] for i in range(2)]
+        results = await asyncio.gather(
+            *(manager.generate_summary(h, batch_generator) for h in histories)
+        )
+
+        assert results == [None, None]
+
+
+    async def test_full_batch_cancels_wait_timer(self):
+        """测试凑满提前发出的批次不会让旧定时器把下一批过早发出"""
+        from ai_history_manager.manager import _SummaryBatcher
+
+        calls = []
+
+        async def batch_generator(prompts):
+            calls.append(len(prompts))
+            return list(prompts)
+
+        batcher = _SummaryBatcher(max_batch=2, max_wait=0.2)
+        assert await asyncio.gather(
+            batcher.submit(batch_generator, "a"), batcher.submit(batch_generator, "b")
+        ) == ["a", "b"]
+
+        # 下一批在旧定时器到期前开始，应等满自己的 max_wait 后合并发出
+        await asyncio.sleep(0.12)
+        first = asyncio.ensure_future(batcher.submit(batch_generator, "c"))
+        await asyncio.sleep(0.12)
+        second = asyncio.ensure_future(batcher.submit(batch_generator, "d"))
+
+        assert await asyncio.gather(first, second) == ["c", "d"]
+        assert calls == [2, 2]
+        assert not batcher._timers
+
+    async def test_batch_task_cancelled(self):
+        """测试批次任务被取消时等待方收到异常而不是永远挂起"""
+        from ai_history_manager.manager import _SummaryBatcher
+
+        started = asyncio.Event()
+
+        async def batch_generator(prompts):
+            started.set()
+            await asyncio.Event().wait()
+
+        batcher = _SummaryBatcher(max_batch=1)
+        waiter = asyncio.ensure_future(batcher.submit(batch_generator, "prompt"))
+        await started.wait()
+        for task in batcher._tasks:
+            task.cancel()
+
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(waiter, timeout=1)
+
 class TestWarningHeader:
     """警告头测试"""
 
@@ -275,3 +567,42 @@ class TestWarningHeader:
         manager._truncated = True
         manager._truncate_info = "test warning"
         assert manager.get_warning_header() is None
+
+
+class TestFormatHistory:
+    """摘要输入格式化测试"""
+
+    def test_max_chars_truncates(self):
+        """测试超出总长度上限时截断并追加标记"""
+        from ai_history_manager.utils import format_history_for_summary
+
+        history = [{"role": "user", "content": "x" * 400} for _ in range(50)]
+        full = format_history_for_summary(history)
+
+        assert format_history_for_summary(history, max_chars=1000) == (
+            full[:1000] + "\n...(truncated)"
+        )
+        assert format_history_for_summary(history, max_chars=len(full)) == full
+
+    def test_non_string_role(self):
+        """测试 role 为 None 时按字符串输出而不抛出异常"""
+        from ai_history_manager.utils import format_history_for_summary
+
+        history = [{"role": None, "content": "hi"}, {"role": "user", "content": "ok"}]
+        assert format_history_for_summary(history) == "[None]: hi\n[user]: ok"
+
+    def test_unhashable_role(self):
+        """测试 role 为列表/字典时视为未知类型而不抛出异常"""
+        from ai_history_manager.utils.structure import (
+            summarize_history_structure,
+            validate_history_alternation,
+        )
+
+        history = [
+            {"role": ["user"], "content": "a"},
+            {"role": {"x": 1}, "content": "b"},
+            {"role": "assistant", "content": "c"},
+        ]
+        assert "seq=??A" in summarize_history_structure(history)
+        valid, _ = validate_history_alternation(history)
+        assert valid
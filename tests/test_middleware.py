@@ -0,0 +1,181 @@
+"""FastAPI 中间件测试"""
+import json
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from starlette.testclient import TestClient
+
+from ai_history_manager import HistoryConfig, TruncateStrategy
+from ai_history_manager.middleware import HistoryManagerMiddleware
+from ai_history_manager.middleware.fastapi import _RECEIVE_CHUNK, _replay_receive
+
+
+def _make_app(received: dict):
+    """构造记录请求体与 Content-Length 的 ASGI 应用"""
+
+    async def app(scope, receive, send):
+        message = await receive()
+        headers = dict(scope["headers"])
+        received["body"] = message["body"]
+        received["content_length"] = headers.get(b"content-length")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return app
+
+
+class TestHistoryManagerMiddleware:
+    """请求体重写测试"""
+
+    def test_truncated_body_and_content_length(self):
+        """截断后的请求体可被下游解析，且 Content-Length 与之一致"""
+        received = {}
+        config = HistoryConfig(
+            strategies=[TruncateStrategy.AUTO_TRUNCATE],
+            max_messages=4,
+        )
+        app = HistoryManagerMiddleware(_make_app(received), config=config)
+        messages = [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"消息 {i}"}
+            for i in range(10)
+        ]
+
+        client = TestClient(app)
+        response = client.post("/v1/messages", json={"model": "m", "messages": messages})
+
+        assert response.status_code == 200
+        body = json.loads(received["body"])
+        assert body["model"] == "m"
+        assert len(body["messages"]) == 4
+        assert body["messages"][-1]["content"] == "消息 9"
+        assert int(received["content_length"]) == len(received["body"])
+
+    def test_truncated_body_keeps_big_ints(self):
+        """重写请求体时超出 64 位的整数保持原值"""
+        received = {}
+        config = HistoryConfig(
+            strategies=[TruncateStrategy.AUTO_TRUNCATE],
+            max_messages=2,
+        )
+        app = HistoryManagerMiddleware(_make_app(received), config=config)
+        big = 2**64 + 1
+        messages = [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"消息 {i}"}
+            for i in range(5)
+        ]
+        raw = json.dumps({"model": "m", "seed": big, "messages": messages}).encode()
+
+        client = TestClient(app)
+        client.post("/v1/messages", content=raw, headers={"content-type": "application/json"})
+
+        body = json.loads(received["body"])
+        assert len(body["messages"]) == 2
+        assert body["seed"] == big
+
+    def test_invalid_json_passthrough(self):
+        """无法解析的请求体原样传递"""
+        received = {}
+        config = HistoryConfig(strategies=[TruncateStrategy.AUTO_TRUNCATE])
+        app = HistoryManagerMiddleware(_make_app(received), config=config)
+
+        client = TestClient(app)
+        response = client.post(
+            "/v1/messages",
+            content=b"not json",
+            headers={"content-type": "application/json"},
+        )
+
+        assert response.status_code == 200
+        assert received["body"] == b"not json"
+
+    def test_untouched_history_forwards_original_body(self):
+        """历史未被改写时转发原始请求体"""
+        received = {}
+        config = HistoryConfig(strategies=[TruncateStrategy.AUTO_TRUNCATE])
+        app = HistoryManagerMiddleware(_make_app(received), config=config)
+        raw = b'{"messages": [{"role": "user", "content": "hi"}],  "model": "m"}'
+
+        client = TestClient(app)
+        client.post("/v1/messages", content=raw, headers={"content-type": "application/json"})
+
+        assert received["body"] == raw
+
+    def test_error_retry_only_skips_body(self, monkeypatch):
+        """仅启用 ERROR_RETRY 时不解析请求体"""
+        import ai_history_manager.middleware.fastapi as middleware_module
+
+        def fail(_):
+            raise AssertionError("请求体不应被解析")
+
+        monkeypatch.setattr(middleware_module, "_loads_body", fail)
+        received = {}
+        app = HistoryManagerMiddleware(_make_app(received), config=HistoryConfig())
+
+        client = TestClient(app)
+        response = client.post("/v1/messages", json={"messages": [{"role": "user", "content": "hi"}]})
+
+        assert response.status_code == 200
+        assert json.loads(received["body"])["messages"][0]["content"] == "hi"
+
+    def test_path_pattern(self):
+        """字面量与正则路径模式的匹配结果一致"""
+        literal = HistoryManagerMiddleware(_make_app({}), path_pattern="/v1/messages")
+        regex = HistoryManagerMiddleware(_make_app({}), path_pattern=r"^/v\d+/chat")
+
+        assert literal._match_path("/api/v1/messages")
+        assert not literal._match_path("/health")
+        assert regex._match_path("/v2/chat/completions")
+        assert not regex._match_path("/api/v2/chat")
+
+        prefix = HistoryManagerMiddleware(_make_app({}), path_pattern="^/v1/")
+        assert prefix._match_path("/v1/messages")
+        assert not prefix._match_path("/api/v1/messages")
+
+    def test_non_json_content_type_skips_body(self, monkeypatch):
+        """非 JSON 的 Content-Type 不读取也不解析请求体"""
+        import ai_history_manager.middleware.fastapi as middleware_module
+
+        def fail(_):
+            raise AssertionError("请求体不应被解析")
+
+        monkeypatch.setattr(middleware_module, "_loads_body", fail)
+        received = {}
+        config = HistoryConfig(strategies=[TruncateStrategy.AUTO_TRUNCATE])
+        app = HistoryManagerMiddleware(_make_app(received), config=config)
+
+        client = TestClient(app)
+        client.post("/v1/messages", content=b"a=1", headers={"content-type": "text/plain"})
+
+        assert received["body"] == b"a=1"
+
+
+class TestReplayReceive:
+    """请求体重放测试"""
+
+    async def test_chunks_then_original_receive(self):
+        """分块重放请求体，结束后交还原 receive"""
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        body = b"x" * (_RECEIVE_CHUNK * 2 + 10)
+        replay = _replay_receive(body, receive)
+
+        messages = [await replay() for _ in range(4)]
+
+        assert [m.get("more_body") for m in messages[:3]] == [True, True, False]
+        assert b"".join(m["body"] for m in messages[:3]) == body
+        assert messages[3] == {"type": "http.disconnect"}
+
+    async def test_small_body_single_message(self):
+        """小请求体一次发送完毕"""
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        replay = _replay_receive(b"{}", receive)
+
+        assert await replay() == {"type": "http.request", "body": b"{}", "more_body": False}
+        assert (await replay())["type"] == "http.disconnect"
@@ -0,0 +1,30 @@
+"""工具调用解析测试"""
+from app.utils.tool_parser import parse_tool_calls, parse_xml_tool_calls
+
+
+class TestParseXmlToolCalls:
+    """XML 格式工具调用解析测试"""
+
+    def test_no_xml_tag(self):
+        """测试无 XML 标签时直接返回剩余文本"""
+        result = parse_xml_tool_calls("  plain text  ")
+        assert result.tool_calls == []
+        assert result.remaining_text == "plain text"
+
+    def test_mixed_case_tag(self):
+        """测试任意大小写的 tool_call 标签都能解析"""
+        text = (
+            "before <tool_Call><tool_name>Read</tool_name>"
+            '<parameters>{"file_path": "/tmp/a"}</parameters></tool_Call>'
+        )
+        result = parse_xml_tool_calls(text)
+        assert len(result.tool_calls) == 1
+        assert result.tool_calls[0].name == "Read"
+        assert result.tool_calls[0].input == {"file_path": "/tmp/a"}
+        assert result.remaining_text == "before"
+
+    def test_auto_detect_falls_back_to_xml(self):
+        """测试没有内联格式时自动回退到 XML 格式"""
+        text = "<TOOL_CALL><tool_name>Bash</tool_name><parameters>{}</parameters></TOOL_CALL>"
+        result = parse_tool_calls(text)
+        assert [call.name for call in result.tool_calls] == ["Bash"]